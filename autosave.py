@@ -0,0 +1,130 @@
+# autosave.py
+# Guardado en segundo plano (sin clases): un diccionario con un hilo trabajador y una sola
+# "ranura" para la última foto del estado. El hilo principal solo copia los datos (barato);
+# el trabajador llama a la función de escritura que se le dio (core.write_save), que usa
+# write_atomic (archivo temporal + fsync + rename) o agrega al diario con fsync, así un
+# cierre a mitad de escritura nunca deja el guardado roto.
+#
+# Los pedidos seguidos se agrupan: si llega otra foto antes de escribir, reemplaza a la
+# anterior. El trabajador espera AUTOSAVE_QUIET_S sin pedidos nuevos (pero nunca más de
+# AUTOSAVE_MAX_WAIT_S desde el primero), de modo que varias muertes seguidas son una escritura.
+
+import os
+import threading
+import time
+
+AUTOSAVE_QUIET_S = 1.5
+AUTOSAVE_MAX_WAIT_S = 8.0
+
+
+# ----------------------
+# ESCRITURA ATÓMICA
+# ----------------------
+
+def write_atomic(path, text):
+    """Escribe 'text' en 'path' sin dejar nunca un archivo a medias.
+
+    Se escribe en path + ".tmp", se fuerza a disco con fsync y recién entonces se
+    reemplaza el original con os.replace (atómico en el mismo sistema de archivos).
+    """
+    tmp = path + ".tmp"
+    mode = "wb" if isinstance(text, (bytes, bytearray)) else "w"
+    with open(tmp, mode) as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # Que el cambio de nombre también quede en disco (POSIX)
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+# ----------------------
+# TRABAJADOR DE GUARDADO
+# ----------------------
+
+def make_autosaver(write, quiet_s=AUTOSAVE_QUIET_S, max_wait_s=AUTOSAVE_MAX_WAIT_S):
+    """Crea un guardador. write(foto) corre en el hilo trabajador y hace la escritura a disco."""
+    return {
+        "write": write,
+        "quiet_s": quiet_s, "max_wait_s": max_wait_s,
+        "cond": threading.Condition(),
+        "pending": None,        # Última foto sin escribir
+        "first_at": 0.0,        # Cuándo llegó el primer pedido del grupo actual
+        "last_at": 0.0,         # Cuándo llegó el último pedido
+        "busy": False,          # El trabajador está escribiendo
+        "urgent": False,        # Escribir ya, sin esperar el agrupamiento
+        "thread": None,
+        "writes": 0, "requests": 0,
+    }
+
+def request_save(saver, snapshot, urgent=False):
+    """Deja 'snapshot' para guardar (reemplaza a la pendiente, si había) y despierta al trabajador."""
+    with saver["cond"]:
+        now = time.monotonic()
+        if saver["pending"] is None:
+            saver["first_at"] = now
+        saver["pending"] = snapshot
+        saver["last_at"] = now
+        saver["urgent"] = saver["urgent"] or urgent
+        saver["requests"] += 1
+        if saver["thread"] is None:
+            saver["thread"] = threading.Thread(target=_worker, args=(saver,), name="autosave", daemon=True)
+            saver["thread"].start()
+        saver["cond"].notify_all()
+
+def flush_saves(saver, timeout=None):
+    """Escribe ya lo pendiente y espera a que termine. Devuelve True si no quedó nada por escribir."""
+    cond = saver["cond"]
+    with cond:
+        if saver["pending"] is not None:
+            saver["urgent"] = True
+            cond.notify_all()
+        return cond.wait_for(lambda: saver["pending"] is None and not saver["busy"], timeout)
+
+def cancel_saves(saver, timeout=None):
+    """Descarta lo pendiente y espera a que termine la escritura en curso (antes de borrar el archivo)."""
+    cond = saver["cond"]
+    with cond:
+        saver["pending"] = None
+        saver["urgent"] = False
+        cond.notify_all()
+        return cond.wait_for(lambda: not saver["busy"], timeout)
+
+def _worker(saver):
+    """Hilo trabajador: agrupa pedidos y escribe la foto más reciente."""
+    cond = saver["cond"]
+    while True:
+        with cond:
+            while True:
+                if saver["pending"] is not None:
+                    if saver["urgent"]:
+                        break
+                    deadline = min(saver["last_at"] + saver["quiet_s"], saver["first_at"] + saver["max_wait_s"])
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                    cond.wait(wait)
+                else:
+                    cond.wait()
+            snapshot = saver["pending"]
+            saver["pending"] = None
+            saver["urgent"] = False
+            saver["busy"] = True
+        try:
+            saver["write"](snapshot)
+            saver["writes"] += 1
+            print("Partida guardada correctamente")
+        except Exception as e:
+            print(f"Error guardando partida: {e}")
+        finally:
+            with cond:
+                saver["busy"] = False
+                cond.notify_all()
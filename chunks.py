@@ -0,0 +1,203 @@
+# chunks.py
+# Mapas grandes por bloques ("chunks") respaldados por un archivo mapeado en memoria (mmap).
+#
+# Un mapa por bloques es también una grilla de grid.py: tiene "w", "h" y "cells", solo que
+# "cells" es un mmap del archivo de casillas (un byte por casilla, fila por fila). Así el
+# resto del juego (FOV, IA, render) lo usa sin cambios. Los bloques de CHUNK_SIZE x CHUNK_SIZE
+# se generan recién cuando el jugador se acerca, y al guardar solo se escriben a disco los
+# bloques modificados.
+#
+# El archivo se crea disperso (truncate): las casillas nunca tocadas leen 0, que es suelo.
+# Por eso, antes de tallar un bloque se rellenan de pared él y sus ocho vecinos ("amurallar");
+# así todo lo que rodea a la parte generada es pared sin escribir el mapa entero.
+
+import json
+import mmap
+import os
+import random
+
+from grid import TILE_FLOOR, TILE_WALL, fill_rect
+
+CHUNK_SIZE = 64
+PAGE = mmap.ALLOCATIONGRANULARITY
+
+
+# ----------------------
+# APERTURA Y CIERRE
+# ----------------------
+
+def open_chunked_map(path, width, height, seed=0, chunk_size=CHUNK_SIZE):
+    """Crea un mapa por bloques nuevo en 'path' (archivo disperso, sin escribir casillas) y lo devuelve como grilla."""
+    with open(path, "wb") as f:
+        f.truncate(width * height)
+    return _map_file(path, width, height, seed, chunk_size, generated=[], walled=[])
+
+def reopen_chunked_map(path):
+    """Vuelve a abrir un mapa por bloques guardado (lee el archivo de metadatos .json)."""
+    with open(path + ".json", "r") as f:
+        meta = json.load(f)
+    # Los mapas guardados antes del archivo disperso se llenaban de pared al crearlos
+    walled = meta.get("walled")
+    return _map_file(path, meta["w"], meta["h"], meta["seed"], meta["chunk"], meta["generated"],
+                     walled=walled, all_walled=walled is None)
+
+def _map_file(path, width, height, seed, chunk_size, generated, walled, all_walled=False):
+    """Mapea el archivo de casillas en memoria y arma el diccionario del mapa."""
+    f = open(path, "r+b")
+    chunks_x = (width + chunk_size - 1) // chunk_size
+    chunks_y = (height + chunk_size - 1) // chunk_size
+    store = {
+        "w": width, "h": height,
+        "cells": mmap.mmap(f.fileno(), width * height),
+        "file": f, "path": path, "seed": seed, "chunk": chunk_size,
+        "chunks_x": chunks_x, "chunks_y": chunks_y,
+        "generated": bytearray(chunks_x * chunks_y),
+        "walled": bytearray([all_walled]) * (chunks_x * chunks_y),   # Bloques ya rellenos de pared
+        "dirty": set(),
+    }
+    for ci in generated:
+        store["generated"][ci] = 1
+    for ci in walled or ():
+        store["walled"][ci] = 1
+    return store
+
+def is_chunked(game_map):
+    """Indica si la grilla es un mapa por bloques (mmap) y no una grilla en memoria."""
+    return "chunk" in game_map
+
+def close_chunked_map(store):
+    """Guarda los bloques pendientes y libera el mmap y el archivo."""
+    flush_chunks(store)
+    store["cells"].close()
+    store["file"].close()
+
+
+# ----------------------
+# BLOQUES: GENERACIÓN PEREZOSA
+# ----------------------
+
+def chunk_of(store, x, y):
+    """Devuelve las coordenadas (cx, cy) del bloque que contiene la casilla (x, y)."""
+    return x // store["chunk"], y // store["chunk"]
+
+def chunk_bounds(store, cx, cy):
+    """Devuelve (x1, y1, x2, y2) inclusive del bloque (cx, cy), recortado al mapa."""
+    size = store["chunk"]
+    return (cx * size, cy * size,
+            min(store["w"], (cx + 1) * size) - 1, min(store["h"], (cy + 1) * size) - 1)
+
+def chunk_room(store, cx, cy):
+    """Habitación (x1, y1, x2, y2) del bloque (cx, cy). Depende solo de la semilla: no lee el mapa."""
+    x1, y1, x2, y2 = chunk_bounds(store, cx, cy)
+    rng = random.Random(f"{store['seed']}:room:{cx}:{cy}")
+    w = rng.randint(3, max(3, min(9, x2 - x1 - 3)))
+    h = rng.randint(3, max(3, min(9, y2 - y1 - 3)))
+    rx = rng.randint(x1 + 1, max(x1 + 1, x2 - w))
+    ry = rng.randint(y1 + 1, max(y1 + 1, y2 - h))
+    return (rx, ry, rx + w - 1, ry + h - 1)
+
+def _edge_door(store, cx, cy, horizontal):
+    """Casilla de paso en el borde derecho (horizontal) o inferior del bloque (cx, cy).
+
+    Ambos bloques vecinos calculan la misma puerta con la semilla, así que los pasillos
+    siempre se encuentran aunque se generen en momentos distintos.
+    """
+    x1, y1, x2, y2 = chunk_bounds(store, cx, cy)
+    rng = random.Random(f"{store['seed']}:door:{cx}:{cy}:{int(horizontal)}")
+    if horizontal:
+        return (x2, rng.randint(y1 + 1, max(y1 + 1, y2 - 1)))
+    return (rng.randint(x1 + 1, max(x1 + 1, x2 - 1)), y2)
+
+def _carve_to(store, x1, y1, x2, y2):
+    """Talla un pasillo en L desde (x1, y1) hasta (x2, y2)."""
+    fill_rect(store, min(x1, x2), y1, max(x1, x2), y1, TILE_FLOOR)
+    fill_rect(store, x2, min(y1, y2), x2, max(y1, y2), TILE_FLOOR)
+
+def wall_chunk(store, cx, cy):
+    """Rellena de pared el bloque (cx, cy) si todavía no se hizo (y si está dentro del mapa)."""
+    if not (0 <= cx < store["chunks_x"] and 0 <= cy < store["chunks_y"]):
+        return
+    ci = cy * store["chunks_x"] + cx
+    if store["walled"][ci]:
+        return
+    x1, y1, x2, y2 = chunk_bounds(store, cx, cy)
+    fill_rect(store, x1, y1, x2, y2, TILE_WALL)
+    store["walled"][ci] = 1
+    store["dirty"].add(ci)
+
+def generate_chunk(store, cx, cy):
+    """Genera el bloque (cx, cy): una habitación unida a las puertas de sus cuatro bordes."""
+    for ny in (cy - 1, cy, cy + 1):
+        for nx in (cx - 1, cx, cx + 1):
+            wall_chunk(store, nx, ny)
+    room = chunk_room(store, cx, cy)
+    fill_rect(store, room[0], room[1], room[2], room[3], TILE_FLOOR)
+    mx = (room[0] + room[2]) // 2; my = (room[1] + room[3]) // 2
+    doors = []
+    if cx + 1 < store["chunks_x"]: doors.append(_edge_door(store, cx, cy, True))
+    if cy + 1 < store["chunks_y"]: doors.append(_edge_door(store, cx, cy, False))
+    if cx > 0:
+        dx, dy = _edge_door(store, cx - 1, cy, True); doors.append((dx + 1, dy))
+    if cy > 0:
+        dx, dy = _edge_door(store, cx, cy - 1, False); doors.append((dx, dy + 1))
+    for dx, dy in doors:
+        _carve_to(store, mx, my, dx, dy)
+    ci = cy * store["chunks_x"] + cx
+    store["generated"][ci] = 1
+    store["dirty"].add(ci)
+
+def ensure_chunk(store, cx, cy):
+    """Genera el bloque (cx, cy) si todavía no existe. Devuelve True si lo generó."""
+    if not (0 <= cx < store["chunks_x"] and 0 <= cy < store["chunks_y"]):
+        return False
+    if store["generated"][cy * store["chunks_x"] + cx]:
+        return False
+    generate_chunk(store, cx, cy)
+    return True
+
+def ensure_area(store, x, y, radius):
+    """Genera los bloques que tocan el cuadrado de 'radius' casillas alrededor de (x, y).
+
+    Devuelve la lista de bloques (cx, cy) recién generados.
+    """
+    cx1, cy1 = chunk_of(store, max(0, x - radius), max(0, y - radius))
+    cx2, cy2 = chunk_of(store, min(store["w"] - 1, x + radius), min(store["h"] - 1, y + radius))
+    new_chunks = []
+    for cy in range(cy1, cy2 + 1):
+        for cx in range(cx1, cx2 + 1):
+            if ensure_chunk(store, cx, cy):
+                new_chunks.append((cx, cy))
+    return new_chunks
+
+def mark_dirty(store, x, y):
+    """Marca como modificado el bloque que contiene (x, y) (por ejemplo al poner la salida)."""
+    cx, cy = chunk_of(store, x, y)
+    store["dirty"].add(cy * store["chunks_x"] + cx)
+
+
+# ----------------------
+# PERSISTENCIA
+# ----------------------
+
+def flush_chunks(store):
+    """Escribe a disco solo los bloques modificados y actualiza el archivo de metadatos."""
+    if not store["dirty"]:
+        return 0
+    w = store["w"]; size = w * store["h"]; mm = store["cells"]
+    for ci in sorted(store["dirty"]):
+        x1, y1, x2, y2 = chunk_bounds(store, ci % store["chunks_x"], ci // store["chunks_x"])
+        start = (y1 * w + x1) // PAGE * PAGE
+        end = min(size, y2 * w + x2 + 1)
+        mm.flush(start, end - start)
+    flushed = len(store["dirty"])
+    store["dirty"].clear()
+    meta = {
+        "w": store["w"], "h": store["h"], "seed": store["seed"], "chunk": store["chunk"],
+        "generated": [i for i, g in enumerate(store["generated"]) if g],
+        "walled": [i for i, g in enumerate(store["walled"]) if g],
+    }
+    tmp = store["path"] + ".json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, store["path"] + ".json")
+    return flushed
@@ -0,0 +1,160 @@
+# combat_sim.py
+# Simulador Monte Carlo de duelos (jugador vs. enemigo) vectorizado con NumPy.
+# Usa las mismas fórmulas que core.calc_damage, core.roll_hit_and_crit,
+# core.apply_status_ticks y el reparto 75/15/10 de core.enemy_turn, pero para
+# N combates independientes a la vez. Sirve para balancear pisos sin ventana.
+#
+# Uso: python combat_sim.py [nivel] [duelos]
+
+import sys
+import time
+
+import numpy as np
+
+import core
+
+
+# ----------------------
+# FÓRMULAS VECTORIZADAS
+# ----------------------
+
+def roll_hit_and_crit_v(rng, atk, dfn, atk_speed, def_speed):
+    """Versión vectorizada de core.roll_hit_and_crit. Devuelve (hit, crit) como arrays booleanos."""
+    n = len(atk)
+    hit_chance = np.clip(0.75 + (atk - dfn) * 0.015, 0.2, 0.98)
+    hit = rng.random(n) <= hit_chance
+    dodge = np.clip((def_speed - atk_speed) * 0.03 + 0.05, 0.02, 0.35)
+    hit &= ~(rng.random(n) < dodge)
+    crit = hit & (rng.random(n) < 0.06 + atk * 0.008)
+    return hit, crit
+
+def calc_damage_v(rng, atk, dfn, power, crit):
+    """Versión vectorizada de core.calc_damage (power puede ser escalar o array)."""
+    raw = atk * power * rng.uniform(0.85, 1.15, len(atk))
+    mit = dfn / (dfn + 20)
+    dmg = np.maximum(1, np.floor(raw * (1 - mit))).astype(np.int64)
+    return np.where(crit, np.floor(dmg * 1.8).astype(np.int64), dmg)
+
+def bleed_damage_v(hp_max):
+    """Daño por sangrado de core.apply_status_ticks (3% de HP max, mínimo 1)."""
+    return np.maximum(1, np.floor(hp_max * 0.03).astype(np.int64))
+
+
+# ----------------------
+# ESTADÍSTICAS DE ENTIDADES
+# ----------------------
+
+def roll_enemy_stats(rng, level, n):
+    """Genera n bloques de estadísticas con las mismas tiradas que core.make_enemy."""
+    hp = rng.integers(10, 17, n) + level * 6
+    return {
+        "hp": hp, "hp_max": hp.copy(),
+        "atk": rng.integers(6, 11, n) + level * 2,
+        "def": rng.integers(4, 9, n) + level * 1,
+        "speed": np.full(n, 4),  # Los enemigos no tienen 'speed': roll_hit_and_crit usa 4
+    }
+
+def player_stats_block(stats, n):
+    """Expande un diccionario de estadísticas del jugador (como core.make_player) a arrays de tamaño n."""
+    base = core.make_player(0, 0)
+    base.update(stats or {})
+    return {k: np.full(n, base[k]) for k in ("hp", "hp_max", "atk", "def", "speed")}
+
+
+# ----------------------
+# SIMULACIÓN
+# ----------------------
+
+def simulate_duels(player_stats=None, level=1, n=100000, max_turns=200, seed=None, hp_bins=20):
+    """Simula n duelos en los que el jugador usa siempre el ataque básico (tecla 1).
+
+    Cada turno: el jugador ataca (o pierde el turno si está aturdido); si el enemigo sigue
+    vivo responde como en core.enemy_turn (75% ataque, 15% sangrado, 10% aturdir) y luego
+    se aplican los ticks de sangrado. Devuelve un diccionario con:
+      win_rate, loss_rate, timeout_rate, turns (turno en que terminó cada duelo),
+      turns_to_kill (histograma de turnos en las victorias, índice = turno),
+      hp_left (HP restante del jugador en cada victoria) y hp_hist (conteos, bordes)
+      con el HP restante como porcentaje de hp_max.
+    """
+    rng = np.random.default_rng(seed)
+    p = player_stats_block(player_stats, n)
+    e = roll_enemy_stats(rng, level, n)
+    p_stun = np.zeros(n, dtype=bool)
+    p_bleed = np.zeros(n, dtype=np.int64)
+    result = np.zeros(n, dtype=np.int8)   # 0 = en curso, 1 = victoria, -1 = derrota
+    turns = np.full(n, max_turns, dtype=np.int64)
+
+    for turn in range(1, max_turns + 1):
+        idx = np.flatnonzero(result == 0)
+        if idx.size == 0:
+            break
+
+        # Turno del jugador: ataque básico (power 1.0) salvo que esté aturdido
+        stunned = p_stun[idx]
+        p_stun[idx] = False
+        att = idx[~stunned]
+        hit, crit = roll_hit_and_crit_v(rng, p["atk"][att], e["def"][att], p["speed"][att], e["speed"][att])
+        dmg = calc_damage_v(rng, p["atk"][att], e["def"][att], 1.0, crit)
+        e["hp"][att] -= np.where(hit, dmg, 0)
+        dead = att[e["hp"][att] <= 0]
+        result[dead] = 1
+        turns[dead] = turn
+        idx = idx[result[idx] == 0]
+
+        # Turno del enemigo (75% ataque, 15% sangrado, 10% aturdir)
+        choice = rng.random(idx.size)
+        stun_try = choice >= 0.9
+        stun_ok = stun_try & (rng.random(idx.size) < 0.4)
+        p_stun[idx[stun_ok]] = True
+        att = idx[~stun_ok]
+        c = choice[~stun_ok]
+        power = np.where(c < 0.75, 1.0, np.where(c < 0.9, 0.9, 0.6))
+        hit, crit = roll_hit_and_crit_v(rng, e["atk"][att], p["def"][att], e["speed"][att], p["speed"][att])
+        dmg = calc_damage_v(rng, e["atk"][att], p["def"][att], power, crit)
+        p["hp"][att] -= np.where(hit, dmg, 0)
+        p_bleed[att[hit & (c >= 0.75) & (c < 0.9)]] += 2
+
+        # Ticks de estado (el enemigo nunca sangra con el ataque básico)
+        bleeding = idx[p_bleed[idx] > 0]
+        p["hp"][bleeding] -= bleed_damage_v(p["hp_max"][bleeding])
+        p_bleed[bleeding] -= 1
+
+        lost = idx[p["hp"][idx] <= 0]
+        result[lost] = -1
+        turns[lost] = turn
+
+    wins = result == 1
+    hp_left = p["hp"][wins]
+    hp_pct = hp_left / p["hp_max"][wins] * 100 if hp_left.size else hp_left
+    return {
+        "n": n,
+        "level": level,
+        "win_rate": float(wins.mean()),
+        "loss_rate": float((result == -1).mean()),
+        "timeout_rate": float((result == 0).mean()),
+        "turns": turns,
+        "turns_to_kill": np.bincount(turns[wins], minlength=2),
+        "hp_left": hp_left,
+        "hp_hist": np.histogram(hp_pct, bins=hp_bins, range=(0, 100)),
+    }
+
+def print_summary(res):
+    """Imprime un resumen legible de los resultados de simulate_duels."""
+    print(f"Nivel {res['level']} | {res['n']} duelos")
+    print(f"Victorias: {res['win_rate']*100:.1f}% | Derrotas: {res['loss_rate']*100:.1f}% | Sin terminar: {res['timeout_rate']*100:.1f}%")
+    if res["hp_left"].size:
+        wins_turns = np.repeat(np.arange(len(res["turns_to_kill"])), res["turns_to_kill"])
+        print(f"Turnos para matar: media {wins_turns.mean():.2f}, p50 {np.percentile(wins_turns, 50):.0f}, p90 {np.percentile(wins_turns, 90):.0f}")
+        print(f"HP restante: media {res['hp_left'].mean():.1f}")
+    counts, edges = res["hp_hist"]
+    for count, lo in zip(counts, edges):
+        print(f"  {lo:5.0f}%  {count}")
+
+
+if __name__ == "__main__":
+    level = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    t0 = time.perf_counter()
+    res = simulate_duels(level=level, n=n)
+    print_summary(res)
+    print(f"Tiempo: {time.perf_counter() - t0:.2f} s")
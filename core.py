@@ -0,0 +1,1771 @@
+# core.py
+# Núcleo de simulación del roguelike (sin clases y sin renderizado).
+# Contiene el mapa, las entidades, la IA, el combate y la tienda. No importa pygame,
+# así que puede usarse sin ventana (pruebas automáticas, trabajos de balance).
+
+# ----------------------
+# LIBRERÍAS
+# ----------------------
+import json
+import os
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from grid import (TILE_FLOOR, TILE_WALL, TILE_SHOP, TILE_EXIT, WALKABLE, OPAQUE,
+                  make_grid, copy_grid, grid_from_rows, get_tile, set_tile,
+                  is_walkable, fill_rect)
+from chunks import (open_chunked_map, reopen_chunked_map, close_chunked_map, is_chunked,
+                    chunk_room, ensure_chunk, ensure_area, mark_dirty, flush_chunks)
+from particle_pool import make_pool, spawn_burst, update_pool, clear_pool, seed_pool
+from rng import new_run_seed, derive_seed, make_stream, make_streams
+from scheduler import make_scheduler, schedule, clear_scheduler
+from autosave import make_autosaver, request_save, flush_saves, cancel_saves, write_atomic
+from leaderboard import add_entry, top_scores
+from savefile import (encode_save, decode_save, is_binary_save, encode_journal_header, encode_delta,
+                      encode_frame, apply_journal, same_floor)
+
+# ----------------------
+# CONFIGURACIÓN GLOBAL
+# ----------------------
+MAP_SIZE = 25
+VISION_RADIUS = 6
+
+# Empujones visuales (vx, vy): fracción que queda en cada paso de simulación
+ANIM_DECAY = 0.6
+
+# Pisos "sin fin": mapas grandes por bloques guardados en un archivo mapeado en memoria
+ENDLESS_MAP_SIZE = 2048
+ENDLESS_MAP_FILE = "endless_map.bin"
+CHUNK_LOAD_RADIUS = 24   # Casillas alrededor del jugador que deben estar generadas
+CHASE_MAX_DIST = 40      # Alcance máximo del BFS de persecución
+
+# Archivos de guardado
+SAVE_FILE = "save_game.sav"            # Formato binario (ver savefile.py)
+LEGACY_SAVE_FILE = "save_game.json"    # Formato anterior: solo se lee, para no perder partidas viejas
+JOURNAL_FILE = "save_game.journal"     # Cambios desde el último checkpoint (SAVE_FILE)
+JOURNAL_MAX_BYTES = 64 * 1024          # Pasado este tamaño el diario se compacta en un checkpoint nuevo
+
+
+# ----------------------
+# CARGA DE DATOS (JSON)
+# ----------------------
+
+def load_enemy_types():
+    """Carga las definiciones de enemigos desde enemies.json o usa datos por defecto."""
+    try:
+        with open('enemies.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("ERROR: No se encontró el archivo enemies.json. Usando datos por defecto.")
+        # Datos por defecto... (se mantiene el código original para esta sección)
+        return {
+            "Murciélago de Caverna": {
+                "sprite": "Murciélago de Caverna.png",
+                "dialogues": ["Tus pasos retumban como un tambor en mi cabeza.", "Los humanos nunca aprenden, siempre suben… o bajan.", "Tu sangre suena deliciosa.", "Podría volar lejos, pero prefiero desgarrarte."]
+            },
+            "Esqueleto del Abismo": {
+                "sprite": "Esqueleto del Abismo.png",
+                "dialogues": ["Te escuché venir desde la otra sala, suenan tus pasos… vivos.", "¿Venís a unirte a nosotros?", "Antes fui un caballero, como vos.", "No hay victoria en este lugar, solo polvo."]
+            },
+            "Rata Gigante": {
+                "sprite": "Rata Gigante.png",
+                "dialogues": ["No todos los días la cena viene con armadura.", "Hueles a miedo.", "Deberías dejarme morderte, es tradición.", "¿Sabés lo que me costó encontrar comida acá abajo?"]
+            },
+            "Slime Sombrío": {
+                "sprite": "SlimeSombrío.png",
+                "dialogues": ["Glup... otro héroe. Qué sorpresa.", "Cada golpe tuyo me hace más grande.", "He comido mejores guerreros que vos.", "¿De verdad trajiste una espada? Soy gelatina."]
+            },
+            "Goblin Minero": {
+                "sprite": "GoblingMinero.png",
+                "dialogues": ["Otra vez un tipo con espada? Pensé que ya se habían extinguido.", "Eh, no toques mi oro o te muerdo los dedos.", "Llevo toda la noche cavando y venís a molestar.", "No me subestimes, humano brillante."]
+            }
+        }
+    except json.JSONDecodeError as e:
+        print(f"ERROR: El archivo enemies.json tiene formato inválido: {e}")
+        return {}
+
+# Cargar los tipos de enemigos
+ENEMY_TYPES = load_enemy_types()
+
+
+# ----------------------
+# ESTADO GLOBAL DEL JUEGO (VARIABLES GLOBALES)
+# ----------------------
+game_map = None    # Grilla del nivel (ver grid.py)
+visible = None     # Grilla de 0/1: casillas visibles ahora
+explored = None    # Grilla de 0/1: casillas ya exploradas
+map_rooms = []
+player = None
+# Números al azar: una semilla por partida y un generador por subsistema (ver rng.py).
+# "mapgen" y "spawns" se vuelven a derivar en cada piso con su número (ver new_level).
+run_seed = 0
+rngs = make_streams(run_seed)
+
+enemies = []
+next_enemy_uid = 1   # Próximo identificador de enemigo (ver new_enemy_uid)
+occupancy = {}   # Índice de ocupación: (x, y) -> enemigo en esa casilla
+exit_pos = (0,0)
+shop_pos = None
+game_state = "exploracion"   # Estados: "exploracion", "combate", "shop", "gameover"
+active_enemy = None
+combat_log = ""
+combat_turn = "player"
+level_number = 1
+escape_chance = 0.45
+combat_log_visible = False   # El mapa muestra el log solo un rato después de combat_log_update
+
+# Eventos con tiempo (ocultar mensajes, turno del enemigo...). El loop de la ventana lo
+# avanza con scheduler.advance(); sin ventana nadie lo avanza y los mensajes quedan visibles.
+timers = make_scheduler()
+COMBAT_LOG_MS = 3000
+SHOP_MESSAGE_MS = 4000
+
+# Si es True, new_level genera pisos sin fin por bloques (ver chunks.py)
+endless_mode = False
+
+# Versión del mapa: se incrementa cada vez que cambian las paredes (ver mark_map_changed)
+map_version = 0
+
+# Índice de accesibilidad del nivel actual (ver build_reach_index)
+reach_index = None
+
+# Campo de distancias al jugador compartido por todos los enemigos que persiguen
+chase_field = None
+chase_field_key = None   # (x, y, map_version) con el que se calculó chase_field
+
+# Variables de Guardado/Puntaje
+enemies_killed = 0
+total_score = 0
+player_nickname = ""
+
+# Efectos Visuales
+particles = make_pool()   # Partículas de efectos (arreglos NumPy, ver particle_pool.py)
+floating_texts = []  # Diccionarios de textos flotantes (daño, oro, etc.)
+
+# Eventos generados por la simulación (se vacían en cada llamada a step)
+events = []
+
+# Si es False no se generan partículas ni textos flotantes (modo sin ventana)
+effects_enabled = True
+
+
+# ----------------------
+# EVENTOS
+# ----------------------
+
+def emit(kind, **data):
+    """Registra un evento de la simulación (movimiento, combate, nivel, etc.) para quien llame a step."""
+    data["type"] = kind
+    events.append(data)
+
+
+# ----------------------
+# ENTIDADES (GENERACIÓN DE DICCIONARIOS)
+# ----------------------
+
+def make_player(x,y):
+    """Crea y retorna un diccionario con las estadísticas base del jugador."""
+    return {
+        "x": x, "y": y,
+        "hp": 80, "hp_max":80,
+        "atk": 15, "def": 10,
+        "gold": 0,
+        "potions": 1,
+        "attack_buff": 0,
+        "speed": 6,
+        "stun": 0,
+        "cd_strike": 0,
+        "cd_arrow": 0,
+        "last_dir": (0, -1),
+        "vx": 0.0, "vy": 0.0, "pvx": 0.0, "pvy": 0.0,
+        "level": 1,
+        "exp": 0,
+        "exp_to_next_level": 15
+    }
+
+def new_enemy_uid():
+    """Devuelve un identificador nuevo para un enemigo (el diario de guardado lo usa para seguirlo)."""
+    global next_enemy_uid
+    uid = next_enemy_uid
+    next_enemy_uid += 1
+    return uid
+
+def make_enemy(x,y,level=1,rng=None,uid=None):
+    """Crea y retorna un diccionario con las estadísticas del enemigo, escaladas por nivel.
+
+    Las tiradas salen de 'rng' (por defecto el generador "spawns" de la partida). Con uid=0
+    el identificador se asigna después (al generar pisos en otro hilo, ver install_floor).
+    """
+    rng = rng or rngs["spawns"]
+    enemy_type = rng.choice(list(ENEMY_TYPES.keys()))
+    enemy_data = ENEMY_TYPES[enemy_type]
+    
+    base_hp = rng.randint(10, 16) + (level * 6)
+    return {
+        "uid": new_enemy_uid() if uid is None else uid,
+        "x": x, "y": y,
+        "hp": base_hp, "hp_max": base_hp,
+        "atk": rng.randint(6, 10) + (level * 2),
+        "def": rng.randint(4, 8) + (level * 1),
+        "active": False,
+        "level": level,
+        "type": enemy_type,
+        "sprite": enemy_data["sprite"],
+        "dialogues": enemy_data["dialogues"],
+        "current_dialogue": "",
+        "gold_drop": rng.randint(3, 10) + level,
+        "patrol_dir": rng.choice([(1,0),(-1,0),(0,1),(0,-1)]),
+        "aggro_range": 6 + level//2,
+        "stun": 0,
+        "vx": 0.0, "vy": 0.0, "pvx": 0.0, "pvy": 0.0
+    }
+
+def enemy_from_save(data):
+    """Arma un enemigo a partir de sus datos guardados, sin tiradas al azar (a diferencia de make_enemy)."""
+    enemy_data = ENEMY_TYPES.get(data['type']) or next(iter(ENEMY_TYPES.values()))
+    level = data['level']
+    return {
+        "uid": data.get('uid') or new_enemy_uid(),
+        "x": data['x'], "y": data['y'],
+        "hp": data['hp'], "hp_max": data['hp_max'],
+        "atk": data['atk'], "def": data['def'],
+        "active": data['active'],
+        "level": level,
+        "type": data['type'],
+        "sprite": enemy_data["sprite"],
+        "dialogues": enemy_data["dialogues"],
+        "current_dialogue": "",
+        "gold_drop": data.get('gold_drop', 0),
+        "patrol_dir": tuple(data.get('patrol_dir', (1, 0))),
+        "aggro_range": 6 + level//2,
+        "stun": data.get('stun', 0),
+        "vx": 0.0, "vy": 0.0, "pvx": 0.0, "pvy": 0.0
+    }
+
+
+# ----------------------
+# ÍNDICE DE OCUPACIÓN DE ENEMIGOS
+# ----------------------
+
+def enemy_at(x, y):
+    """Devuelve el enemigo que ocupa la casilla (x, y) o None."""
+    return occupancy.get((x, y))
+
+def add_enemy(enemy):
+    """Agrega un enemigo a la lista y al índice de ocupación."""
+    enemies.append(enemy)
+    occupancy.setdefault((enemy['x'], enemy['y']), enemy)
+
+def move_enemy(enemy, nx, ny):
+    """Mueve un enemigo a (nx, ny) manteniendo actualizado el índice de ocupación."""
+    old = (enemy['x'], enemy['y'])
+    if occupancy.get(old) is enemy:
+        del occupancy[old]
+    enemy['x'], enemy['y'] = nx, ny
+    occupancy.setdefault((nx, ny), enemy)
+
+def remove_enemy(enemy):
+    """Quita un enemigo (muerto) de la lista y del índice de ocupación."""
+    try: enemies.remove(enemy)
+    except ValueError: pass
+    pos = (enemy['x'], enemy['y'])
+    if occupancy.get(pos) is enemy:
+        del occupancy[pos]
+
+def rebuild_occupancy():
+    """Reconstruye el índice de ocupación a partir de la lista de enemigos (nuevo nivel o carga)."""
+    occupancy.clear()
+    for e in enemies:
+        occupancy.setdefault((e['x'], e['y']), e)
+
+
+# ----------------------
+# PERSISTENCIA (GUARDADO Y CARGA)
+# ----------------------
+
+def snapshot_game():
+    """Copia barata del estado a guardar (solo valores y bytes, nada compartido con el juego).
+
+    Se toma en el hilo principal; la conversión a bytes la hace después el hilo de autoguardado.
+    """
+    return {
+        'player': {
+            'hp': player['hp'],
+            'hp_max': player['hp_max'],
+            'atk': player['atk'],
+            'def': player['def'],
+            'gold': player['gold'],
+            'potions': player['potions'],
+            'attack_buff': player.get('attack_buff', 0),
+            'level': player.get('level', 1),
+            'exp': player.get('exp', 0),
+            'exp_to_next_level': player.get('exp_to_next_level', 15),
+            'cd_strike': player['cd_strike'],
+            'cd_arrow': player['cd_arrow'],
+            'x': player['x'],
+            'y': player['y']
+        },
+        'enemies': [
+            {
+                'uid': e['uid'], 'x': e['x'], 'y': e['y'], 'hp': e['hp'], 'hp_max': e['hp_max'],
+                'atk': e['atk'], 'def': e['def'], 'level': e['level'], 'type': e['type'],
+                'active': e['active'], 'gold_drop': e.get('gold_drop', 0),
+                'stun': e['stun'], 'patrol_dir': e['patrol_dir']
+            }
+            for e in enemies
+        ],
+        # La grilla en memoria se copia como bytes; un mapa por bloques ya vive en su archivo
+        'map_size': (game_map['w'], game_map['h']),
+        'map_cells': None if is_chunked(game_map) else bytes(game_map['cells']),
+        'explored': bytes(explored['cells']),
+        'map_file': game_map["path"] if is_chunked(game_map) else None,
+        'exit_pos': exit_pos,
+        'shop_pos': shop_pos,
+        'enemies_killed': enemies_killed,
+        'total_score': total_score,
+        'level_reached': level_number,
+        'player_nickname': player_nickname,
+        'run_seed': run_seed,
+        'timestamp': datetime.now().timestamp()
+    }
+
+# Lo que hay en disco (checkpoint + diario). Solo lo toca el hilo de autoguardado,
+# salvo reset_journal(), que primero espera a que ese hilo termine.
+journal_state = {"base": None, "checkpoint_id": 0, "size": 0}
+
+def write_checkpoint(snapshot):
+    """Escribe un checkpoint completo y deja el diario vacío apuntando a él."""
+    # Del sistema operativo y no del módulo random: este hilo no debe mover la secuencia con la
+    # que new_run_seed elige la semilla de la próxima partida
+    checkpoint_id = int.from_bytes(os.urandom(4), "little") or 1
+    write_atomic(SAVE_FILE, encode_save(snapshot, checkpoint_id))
+    header = encode_journal_header(checkpoint_id)
+    write_atomic(JOURNAL_FILE, header)
+    journal_state.update(base=snapshot, checkpoint_id=checkpoint_id, size=len(header))
+
+def write_save(snapshot):
+    """Guarda una foto: agrega al diario solo lo que cambió, o escribe un checkpoint completo.
+
+    Hay checkpoint nuevo cuando no hay base en disco, al cambiar de piso o de partida, y
+    cuando el diario pasa de JOURNAL_MAX_BYTES (compactación). Corre en el hilo de autoguardado.
+    """
+    base = journal_state["base"]
+    if base is None or not same_floor(base, snapshot) or journal_state["size"] > JOURNAL_MAX_BYTES:
+        write_checkpoint(snapshot)
+        return
+    delta = encode_delta(base, snapshot)
+    if delta:
+        frame = encode_frame(delta)
+        with open(JOURNAL_FILE, 'ab') as f:
+            f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        journal_state["size"] += len(frame)
+    journal_state["base"] = snapshot
+
+def reset_journal():
+    """Olvida lo que hay en disco: el próximo guardado será un checkpoint completo."""
+    cancel_saves(autosaver)
+    journal_state.update(base=None, checkpoint_id=0, size=0)
+
+autosaver = make_autosaver(write_save)
+
+def save_game(wait=False):
+    """Pide guardar el estado completo del juego (jugador, enemigos y mapa) en SAVE_FILE.
+
+    La escritura se hace en segundo plano (ver autosave.py) y los pedidos seguidos se agrupan
+    en una sola. Con wait=True se escribe enseguida y se espera a que termine (al salir).
+    """
+    if not player_nickname or player is None or game_state == "gameover":
+        return False
+    if is_chunked(game_map):
+        flush_chunks(game_map) # Solo se escriben los bloques modificados
+    request_save(autosaver, snapshot_game(), urgent=wait)
+    if wait:
+        return flush_saves(autosaver)
+    return True
+
+def load_game():
+    """Carga los datos de la última partida guardada (binaria, o JSON si es una partida vieja)."""
+    try:
+        if os.path.exists(SAVE_FILE):
+            with open(SAVE_FILE, 'rb') as f:
+                data = f.read()
+            if is_binary_save(data):
+                saved_data = decode_save(data)
+                if os.path.exists(JOURNAL_FILE):
+                    with open(JOURNAL_FILE, 'rb') as f:
+                        apply_journal(saved_data, f.read())
+                return saved_data
+        if os.path.exists(LEGACY_SAVE_FILE):
+            with open(LEGACY_SAVE_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error cargando partida: {e}")
+    return None
+
+def delete_saves():
+    """Borra la partida guardada (en ambos formatos, con su diario).
+
+    Antes descarta los autoguardados pendientes (reset_journal), así ninguno revive la partida.
+    """
+    reset_journal()
+    for path in (SAVE_FILE, JOURNAL_FILE, LEGACY_SAVE_FILE):
+        if os.path.exists(path): os.remove(path)
+
+def save_leaderboard_entry():
+    """Registra la puntuación final del jugador en el leaderboard (ver leaderboard.py)."""
+    if not player_nickname:
+        return False
+    
+    try:
+        rank = add_entry(player_nickname, total_score, level_number, enemies_killed)
+        print(f"Puntuación guardada en leaderboard (puesto {rank})")
+        return True
+    except Exception as e:
+        print(f"Error guardando leaderboard: {e}")
+        return False
+
+def get_leaderboard(k=10):
+    """Devuelve las k mejores puntuaciones del leaderboard."""
+    try:
+        return top_scores(k)
+    except Exception as e:
+        print(f"Error leyendo leaderboard: {e}")
+    return []
+
+
+# ----------------------
+# GENERACIÓN DE MAPAS
+# ----------------------
+
+def create_empty_map():
+    """Inicializa un mapa lleno de paredes."""
+    return make_grid(MAP_SIZE, MAP_SIZE, TILE_WALL)
+
+def rooms_dungeon(rooms=6, room_min=3, room_max=7, rng=None):
+    """Genera el mapa del calabozo usando el algoritmo 'room-and-corridor' (tiradas de 'rng')."""
+    rng = rng or rngs["mapgen"]
+    dungeon = create_empty_map()
+    room_list = []
+
+    def intersects(r1, r2):
+        """Función auxiliar para verificar si dos habitaciones se superponen."""
+        x1,y1,x2,y2 = r1
+        a1,b1,a2,b2 = r2
+        return (x1 <= a2 and x2 >= a1 and y1 <= b2 and y2 >= b1)
+
+    for _ in range(rooms*4):
+        w = rng.randint(room_min, room_max)
+        h = rng.randint(room_min, room_max)
+        x = rng.randint(1, MAP_SIZE - w - 2)
+        y = rng.randint(1, MAP_SIZE - h - 2)
+        new_room = (x, y, x + w - 1, y + h - 1)
+        if any(intersects(new_room, other) for other in room_list):
+            continue
+        fill_rect(dungeon, new_room[0], new_room[1], new_room[2], new_room[3], TILE_FLOOR)
+        if room_list:
+            px, py = ((room_list[-1][0] + room_list[-1][2]) // 2,
+                      (room_list[-1][1] + room_list[-1][3]) // 2)
+            nx, ny = ((new_room[0] + new_room[2]) // 2,
+                      (new_room[1] + new_room[3]) // 2)
+            carve_corridor(dungeon, px, py, nx, ny, rng)
+        room_list.append(new_room)
+        if len(room_list) >= rooms:
+            break
+
+    # Añadir suelo aleatorio para variar el mapa
+    for _ in range((MAP_SIZE*MAP_SIZE)//50):
+        rx = rng.randint(1, MAP_SIZE-2)
+        ry = rng.randint(1, MAP_SIZE-2)
+        set_tile(dungeon, rx, ry, TILE_FLOOR if rng.random() < 0.75 else TILE_WALL)
+
+    return dungeon, room_list
+
+def carve_corridor(dungeon, x1,y1,x2,y2, rng=None):
+    """Crea un pasillo de suelo entre dos coordenadas (x1, y1) y (x2, y2)."""
+    x1 = max(0, min(x1, dungeon["w"]-1))
+    y1 = max(0, min(y1, dungeon["h"]-1))
+    x2 = max(0, min(x2, dungeon["w"]-1))
+    y2 = max(0, min(y2, dungeon["h"]-1))
+    
+    # Tallado del pasillo (movimiento en X y luego en Y, o viceversa)
+    if (rng or rngs["mapgen"]).random() < 0.5:
+        fill_rect(dungeon, min(x1,x2), y1, max(x1,x2), y1, TILE_FLOOR)
+        fill_rect(dungeon, x2, min(y1,y2), x2, max(y1,y2), TILE_FLOOR)
+    else:
+        fill_rect(dungeon, x1, min(y1,y2), x1, max(y1,y2), TILE_FLOOR)
+        fill_rect(dungeon, min(x1,x2), y2, max(x1,x2), y2, TILE_FLOOR)
+
+def random_free_cell_from_map(game_map, rng=None):
+    """Encuentra y retorna una celda de suelo aleatoria dentro del mapa."""
+    rng = rng or rngs["spawns"]
+    w = game_map["w"]; h = game_map["h"]; cells = game_map["cells"]
+    free_cells = []
+    
+    # Buscar primero en el área central (excluyendo bordes)
+    for y in range(1, h - 1):
+        base = y * w
+        for x in range(1, w - 1):
+            if cells[base + x] == TILE_FLOOR:
+                free_cells.append((x, y))
+    
+    if free_cells:
+        return rng.choice(free_cells)
+    
+    # Buscar en todo el mapa si la búsqueda central falla
+    for i, tile in enumerate(cells):
+        if tile == TILE_FLOOR:
+            free_cells.append((i % w, i // w))
+    
+    if free_cells:
+        return rng.choice(free_cells)
+    
+    # Opción de respaldo: centro del mapa
+    return (w // 2, h // 2)
+
+def mark_map_changed():
+    """Indica que las paredes del mapa cambiaron (invalida los datos derivados del mapa)."""
+    global map_version
+    map_version += 1
+
+
+# ----------------------
+# PATHFINDING Y ACCESIBILIDAD
+# ----------------------
+
+# Vecinos usados por la persecución (los enemigos pueden moverse en diagonal)
+CHASE_DIRECTIONS = [(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)]
+
+def distance_field(start, game_map, max_dist=CHASE_MAX_DIST):
+    """Calcula con un solo BFS la distancia (en pasos de enemigo) de cada casilla a start.
+
+    Devuelve un diccionario índice de casilla (y * w + x) -> distancia. Solo llega hasta
+    max_dist pasos, así el costo no depende del tamaño del mapa; las casillas que no
+    están en el diccionario son paredes, inalcanzables o demasiado lejanas.
+    """
+    w = game_map["w"]; h = game_map["h"]; cells = game_map["cells"]
+    sx, sy = start
+    dist = {sy * w + sx: 0}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        d = dist[y * w + x] + 1
+        if d > max_dist:
+            continue
+        for dx, dy in CHASE_DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h:
+                i = ny * w + nx
+                if i not in dist and WALKABLE[cells[i]]:
+                    dist[i] = d
+                    queue.append((nx, ny))
+    return dist
+
+def get_chase_field():
+    """Devuelve el campo de distancias al jugador, recalculándolo solo si el jugador se movió o cambió el mapa."""
+    global chase_field, chase_field_key
+    key = (player['x'], player['y'], map_version)
+    if chase_field_key != key:
+        chase_field = distance_field((player['x'], player['y']), game_map)
+        chase_field_key = key
+    return chase_field
+
+
+# ----------------------
+# ÍNDICE DE ACCESIBILIDAD
+# ----------------------
+
+# Vecinos del jugador (solo se mueve en horizontal y vertical)
+REACH_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
+def label_components(game_map):
+    """Etiqueta las zonas conectadas del mapa en una sola pasada.
+
+    Devuelve (labels, sizes): labels[y * w + x] es el número de zona de la casilla
+    (0 = pared) y sizes[n] la cantidad de casillas de la zona n.
+    """
+    w = game_map["w"]; h = game_map["h"]; cells = game_map["cells"]
+    labels = array('i', bytes(4 * w * h))
+    sizes = [0]
+    for i in range(w * h):
+        if labels[i] or not WALKABLE[cells[i]]:
+            continue
+        label = len(sizes)
+        labels[i] = label
+        stack = [i]
+        size = 0
+        while stack:
+            j = stack.pop()
+            size += 1
+            x = j % w; y = j // w
+            for dx, dy in REACH_DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < w and 0 <= ny < h:
+                    k = ny * w + nx
+                    if not labels[k] and WALKABLE[cells[k]]:
+                        labels[k] = label
+                        stack.append(k)
+        sizes.append(size)
+    return labels, sizes
+
+def build_reach_index(game_map, spawn_candidates=()):
+    """Construye el índice de accesibilidad del nivel: zonas conectadas + distancias desde el inicio.
+
+    El inicio es el primer candidato de spawn_candidates (por ejemplo centros de habitaciones
+    en orden aleatorio) que esté en la zona más grande; si ninguno lo está, una casilla
+    cualquiera de esa zona. Se calcula una vez por nivel y después las consultas
+    (misma zona, casilla más lejana, casilla alcanzable al azar) son O(1).
+    """
+    w = game_map["w"]; h = game_map["h"]; cells = game_map["cells"]
+    labels, sizes = label_components(game_map)
+    main_label = max(range(1, len(sizes)), key=sizes.__getitem__) if len(sizes) > 1 else 0
+
+    spawn = None
+    for x, y in spawn_candidates:
+        if labels[y * w + x] == main_label and main_label:
+            spawn = (x, y)
+            break
+    if spawn is None:
+        i = labels.index(main_label) if main_label else (h // 2) * w + w // 2
+        spawn = (i % w, i // w)
+
+    # BFS desde el inicio: distancia de cada casilla alcanzable (-1 = inalcanzable)
+    dist = array('i', [-1]) * (w * h)
+    start = spawn[1] * w + spawn[0]
+    dist[start] = 0
+    order = [start]   # Casillas alcanzables ordenadas por distancia creciente
+    head = 0
+    while head < len(order):
+        j = order[head]; head += 1
+        x = j % w; y = j // w
+        d = dist[j] + 1
+        for dx, dy in REACH_DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h:
+                k = ny * w + nx
+                if dist[k] < 0 and WALKABLE[cells[k]]:
+                    dist[k] = d
+                    order.append(k)
+
+    return {"w": w, "labels": labels, "sizes": sizes, "spawn": spawn, "dist": dist, "order": order}
+
+def same_component(index, a, b):
+    """Indica si las casillas a y b son transitables y están conectadas entre sí."""
+    w = index["w"]
+    label = index["labels"][a[1] * w + a[0]]
+    return label != 0 and label == index["labels"][b[1] * w + b[0]]
+
+def reach_distance(index, pos):
+    """Pasos desde el inicio del nivel hasta pos (-1 si no se puede llegar)."""
+    return index["dist"][pos[1] * index["w"] + pos[0]]
+
+def farthest_reachable(index):
+    """Casilla alcanzable más lejana (en pasos) del inicio del nivel."""
+    i = index["order"][-1]
+    return (i % index["w"], i // index["w"])
+
+def random_reachable_cell(index, exclude=(), attempts=20, rng=None):
+    """Casilla alcanzable desde el inicio elegida al azar, evitando las de 'exclude'."""
+    rng = rng or rngs["mapgen"]
+    w = index["w"]; order = index["order"]
+    for _ in range(attempts):
+        i = rng.choice(order)
+        pos = (i % w, i // w)
+        if pos not in exclude:
+            return pos
+    return None
+
+def create_forced_path(player_pos, game_map):
+    """Intenta modificar las paredes para crear un camino transitable hacia una posición lejana."""
+    player_x, player_y = player_pos
+    
+    # Lógica para forzar un camino (sin cambios)
+    if player_x < MAP_SIZE // 2:
+        direction = (1, 0)
+    else:
+        direction = (-1, 0)
+    
+    if player_y < MAP_SIZE // 2:
+        direction = (0, 1)
+    else:
+        direction = (0, -1)
+    
+    x, y = player_x, player_y
+    path = []
+    
+    for _ in range(min(10, max(MAP_SIZE - player_x, player_x, MAP_SIZE - player_y, player_y))):
+        x += direction[0]
+        y += direction[1]
+        
+        if not (0 <= x < MAP_SIZE and 0 <= y < MAP_SIZE):
+            break
+            
+        if get_tile(game_map, x, y) == TILE_WALL:
+            set_tile(game_map, x, y, TILE_FLOOR)
+        
+        path.append((x, y))
+        
+        if x == 0 or x == MAP_SIZE-1 or y == 0 or y == MAP_SIZE-1:
+            return (x, y)
+    
+    if path:
+        return path[-1]
+    
+    return (MAP_SIZE-2, MAP_SIZE-2)
+
+def create_direct_path(start, end, game_map):
+    """Fuerza un camino de suelo directo (horizontal y vertical) entre dos puntos."""
+    start_x, start_y = start
+    end_x, end_y = end
+    
+    x, y = start_x, start_y
+    
+    # Mover en X
+    while x != end_x:
+        if x < end_x:
+            x += 1
+        else:
+            x -= 1
+        
+        if 0 <= x < MAP_SIZE and 0 <= y < MAP_SIZE:
+            if get_tile(game_map, x, y) == TILE_WALL:
+                set_tile(game_map, x, y, TILE_FLOOR)
+    
+    # Mover en Y
+    while y != end_y:
+        if y < end_y:
+            y += 1
+        else:
+            y -= 1
+        
+        if 0 <= x < MAP_SIZE and 0 <= y < MAP_SIZE:
+            if get_tile(game_map, x, y) == TILE_WALL:
+                set_tile(game_map, x, y, TILE_FLOOR)
+    
+    return True
+
+
+# ----------------------
+# VISIBILIDAD (SHADOWCASTING SIMÉTRICO)
+# ----------------------
+
+# Transformaciones de los cuatro cuadrantes: (fila, columna) -> (dx, dy)
+FOV_QUADRANTS = [
+    lambda row, col: (col, -row),   # Norte
+    lambda row, col: (col, row),    # Sur
+    lambda row, col: (row, col),    # Este
+    lambda row, col: (-row, col),   # Oeste
+]
+FOV_CACHE_MAX = 4096
+
+fov_cache = {}           # (x, y, radio, map_version) -> tupla de índices de casillas visibles
+fov_cache_version = -1   # map_version con el que se llenó fov_cache
+visible_cells = []       # Casillas marcadas en 'visible' por el último cálculo
+visibility_version = 0   # Se incrementa cada vez que cambian 'visible' o 'explored'
+
+def compute_fov(px, py, radius, game_map):
+    """Shadowcasting simétrico iterativo. Devuelve los índices (y * w + x) de las casillas visibles desde (px, py).
+
+    Las pendientes se guardan como fracciones enteras (numerador, denominador) para que el
+    resultado sea exacto y simétrico: si A ve a B, B ve a A. Las paredes se ven pero bloquean.
+    """
+    w = game_map["w"]; h = game_map["h"]; tiles = game_map["cells"]
+    cells = [py * w + px]
+    r2 = radius * radius + radius
+    for transform in FOV_QUADRANTS:
+        # Cada fila pendiente: (profundidad, num_inicio, den_inicio, num_fin, den_fin)
+        rows = [(1, -1, 1, 1, 1)]
+        while rows:
+            depth, sn, sd, en, ed = rows.pop()
+            if depth > radius:
+                continue
+            min_col = (2 * depth * sn + sd) // (2 * sd)        # redondeo hacia arriba en empates
+            max_col = -((ed - 2 * depth * en) // (2 * ed))     # redondeo hacia abajo en empates
+            prev_wall = None
+            for col in range(min_col, max_col + 1):
+                dx, dy = transform(depth, col)
+                x, y = px + dx, py + dy
+                inside = 0 <= x < w and 0 <= y < h
+                wall = not inside or OPAQUE[tiles[y * w + x]] == 1
+                if inside and dx * dx + dy * dy <= r2:
+                    # Simetría: el suelo solo es visible si su centro está dentro del cono
+                    if wall or (col * sd >= depth * sn and col * ed <= depth * en):
+                        cells.append(y * w + x)
+                if prev_wall is True and not wall:
+                    sn, sd = 2 * col - 1, 2 * depth
+                if prev_wall is False and wall:
+                    rows.append((depth + 1, sn, sd, 2 * col - 1, 2 * depth))
+                prev_wall = wall
+            if prev_wall is False:
+                rows.append((depth + 1, sn, sd, en, ed))
+    return cells
+
+def reset_visibility():
+    """Crea los buffers 'visible' y 'explored' del nivel actual (una vez por nivel, no por movimiento)."""
+    global visible, explored, visible_cells, visibility_version
+    explored = make_grid(game_map["w"], game_map["h"], 0)
+    visible = make_grid(game_map["w"], game_map["h"], 0)
+    visible_cells = []
+    visibility_version += 1
+
+def compute_visibility(px, py):
+    """Calcula el área visible y explorada desde la posición del jugador (px, py).
+
+    Reutiliza el buffer 'visible' (solo apaga las casillas del cálculo anterior) y guarda el
+    resultado por (x, y, radio, versión del mapa), así que volver a una casilla ya visitada
+    cuesta una búsqueda en el diccionario.
+    """
+    global visible_cells, fov_cache_version, visibility_version
+    if fov_cache_version != map_version or len(fov_cache) >= FOV_CACHE_MAX:
+        fov_cache.clear()
+        fov_cache_version = map_version
+    key = (px, py, VISION_RADIUS, map_version)
+    cells = fov_cache.get(key)
+    if cells is None:
+        cells = tuple(compute_fov(px, py, VISION_RADIUS, game_map)) if 0 <= px < game_map["w"] and 0 <= py < game_map["h"] else ()
+        fov_cache[key] = cells
+    vis = visible["cells"]; exp = explored["cells"]
+    for i in visible_cells:
+        vis[i] = 0
+    for i in cells:
+        vis[i] = 1
+        exp[i] = 1
+    visible_cells = cells
+    visibility_version += 1
+
+
+# ----------------------
+# GESTIÓN DE NIVELES
+# ----------------------
+
+def seed_run(seed=None, *parts):
+    """Fija la semilla de la partida (una nueva si es None) y vuelve a crear sus generadores.
+
+    'parts' distingue otras situaciones con la misma semilla (por ejemplo, reanudar una
+    partida guardada) para que no repitan las secuencias del comienzo.
+    """
+    global run_seed
+    run_seed = new_run_seed() if seed is None else seed
+    rngs.update(make_streams(run_seed, *parts))
+    seed_pool(particles, derive_seed(run_seed, "cosmetics", "particles", *parts))
+
+def new_level(level=1, preserve_stats=True, generate_new_level=True):
+    """Genera un nuevo nivel, resetea el mapa, coloca entidades y gestiona las estadísticas del jugador."""
+    global level_number, combat_log, game_state, active_enemy
+    global enemies_killed, total_score
+    
+    # 1. Almacenar estadísticas actuales si se deben preservar
+    old_player_stats = None
+    if player is not None and preserve_stats:
+        old_player_stats = {
+            'hp': player['hp'], 'hp_max': player['hp_max'], 'atk': player['atk'],
+            'def': player['def'], 'gold': player['gold'], 'potions': player['potions'],
+            'attack_buff': player['attack_buff'], 'level': player.get('level', 1),
+            'exp': player.get('exp', 0), 'exp_to_next_level': player.get('exp_to_next_level', 15),
+            'cd_strike': player['cd_strike'], 'cd_arrow': player['cd_arrow']
+        }
+    
+    level_number = level
+    combat_log = ""
+    game_state = "exploracion"
+    active_enemy = None
+    clear_pool(particles)
+    floating_texts.clear()
+    
+    # 2. Resetear contadores de puntaje si es una nueva partida
+    if not preserve_stats:
+        enemies_killed = 0
+        total_score = 0
+
+    # 3. Generación del mapa y entidades (el piso depende solo de la semilla y su número)
+    if generate_new_level and game_map is not None and is_chunked(game_map):
+        close_chunked_map(game_map)
+    if generate_new_level and endless_mode:
+        rngs["mapgen"] = make_stream(run_seed, "mapgen", level)
+        rngs["spawns"] = make_stream(run_seed, "spawns", level)
+        generate_endless_floor(level, old_player_stats)
+    elif generate_new_level:
+        # Normalmente el piso ya se generó en segundo plano mientras se jugaba el anterior
+        floor = take_pregenerated_floor(level) or generate_floor(run_seed, level)
+        install_floor(floor, old_player_stats)
+        pregenerate_floor(level + 1)
+    
+    # 4. Guardado automático
+    if player_nickname:
+        save_game()
+
+
+# ----------------------
+# GENERACIÓN DE PISOS (TAMBIÉN EN SEGUNDO PLANO)
+# ----------------------
+# generate_floor no toca el estado global: recibe la semilla y el número de piso y devuelve
+# todo lo necesario. Por eso el piso N+1 se puede generar en otro hilo mientras se juega el
+# piso N; al llegar a la salida, install_floor solo lo pone en su lugar.
+
+pregen_executor = None                    # Hilo trabajador (se crea al primer uso)
+pregen = {"key": None, "future": None}    # (semilla, piso) pedido y su resultado futuro
+
+def generate_floor(seed, level):
+    """Genera el piso 'level' de la partida 'seed'. Se puede llamar desde cualquier hilo.
+
+    Devuelve un diccionario con el mapa, las habitaciones, el índice de accesibilidad, el
+    inicio del jugador, los enemigos (sin uid todavía), la salida, la tienda y los generadores
+    "mapgen" y "spawns" del piso.
+    """
+    mapgen = make_stream(seed, "mapgen", level); spawns = make_stream(seed, "spawns", level)
+    dungeon, rooms = rooms_dungeon(rooms=max(4, min(10, 3 + level//2)), room_min=3, room_max=6, rng=mapgen)
+    floor_map = copy_grid(dungeon)
+
+    # Determinar posición de inicio (jugador): centro de una habitación de la zona conectada más grande
+    centers = [((r[0] + r[2])//2, (r[1] + r[3])//2) for r in rooms]
+    mapgen.shuffle(centers)
+    index = build_reach_index(floor_map, centers)
+    sx, sy = index["spawn"]
+
+    # Generar enemigos (como máximo uno por casilla, nunca sobre el jugador)
+    floor_enemies = []
+    taken = {(sx, sy)}
+    num_en = spawns.randint(2 + level//2, 4 + int(level//1.5))
+    for i in range(num_en):
+        ex, ey = random_free_cell_from_map(dungeon, spawns)
+        if (ex, ey) in taken: continue
+        enemy_level = level
+        if spawns.random() < 0.3:
+            enemy_level = min(level + 1, level + 2)
+        floor_enemies.append(make_enemy(ex, ey, level=enemy_level, rng=spawns, uid=0))
+        taken.add((ex, ey))
+
+    # Generar Salida (3) y Tienda (2) con comprobación de accesibilidad
+    # La salida va en la casilla alcanzable más lejana del inicio
+    floor_exit = farthest_reachable(index)
+    if reach_distance(index, floor_exit) == 0:
+        # El jugador está encerrado: se fuerza un camino y se recalcula el índice
+        floor_exit = create_forced_path((sx, sy), floor_map)
+        create_direct_path((sx, sy), floor_exit, floor_map)
+        index = build_reach_index(floor_map, [(sx, sy)])
+    set_tile(floor_map, floor_exit[0], floor_exit[1], TILE_EXIT)
+
+    # La tienda en cualquier casilla alcanzable (ni el inicio ni la salida)
+    floor_shop = None
+    if mapgen.random() < 0.6 or level % 3 == 0:
+        floor_shop = random_reachable_cell(index, exclude=((sx, sy), floor_exit), rng=mapgen)
+        # Tras forzar un camino la zona más grande puede no ser la del jugador
+        if floor_shop and not same_component(index, (sx, sy), floor_shop):
+            floor_shop = None
+        if floor_shop:
+            set_tile(floor_map, floor_shop[0], floor_shop[1], TILE_SHOP)
+
+    return {"seed": seed, "level": level, "map": floor_map, "rooms": rooms, "reach_index": index,
+            "spawn": (sx, sy), "enemies": floor_enemies, "exit_pos": floor_exit, "shop_pos": floor_shop,
+            "mapgen": mapgen, "spawns": spawns}
+
+def install_floor(floor, old_player_stats=None):
+    """Pone en juego un piso devuelto por generate_floor (jugador, enemigos, visibilidad)."""
+    global game_map, player, exit_pos, shop_pos, map_rooms, reach_index
+    level = floor["level"]
+    game_map = floor["map"]
+    map_rooms = floor["rooms"]
+    reach_index = floor["reach_index"]
+    exit_pos = floor["exit_pos"]; shop_pos = floor["shop_pos"]
+    rngs["mapgen"] = floor["mapgen"]; rngs["spawns"] = floor["spawns"]
+
+    # Crear/Restaurar jugador
+    player = make_player(*floor["spawn"])
+    if old_player_stats:
+        player.update(old_player_stats) # Restaurar stats
+
+    enemies.clear()
+    occupancy.clear()
+    for e in floor["enemies"]:
+        e["uid"] = new_enemy_uid()
+        add_enemy(e)
+
+    mark_map_changed()
+
+    # Recalcular visibilidad
+    reset_visibility()
+    compute_visibility(player["x"], player["y"])
+    
+    print(f"Nivel {level} generado. Salida en: {exit_pos}")
+    emit("new_level", level=level, exit_pos=exit_pos, shop_pos=shop_pos)
+
+def pregenerate_floor(level):
+    """Empieza a generar en segundo plano el piso 'level' de la partida actual (si no se pidió ya)."""
+    global pregen_executor
+    if endless_mode:
+        return  # Los pisos sin fin ya se generan por bloques a medida que se avanza
+    key = (run_seed, level)
+    if pregen["key"] == key:
+        return
+    if pregen["future"] is not None:
+        pregen["future"].cancel()
+    if pregen_executor is None:
+        pregen_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pregen")
+    pregen["key"] = key
+    pregen["future"] = pregen_executor.submit(generate_floor, run_seed, level)
+
+def take_pregenerated_floor(level):
+    """Devuelve el piso 'level' generado en segundo plano, o None si hay que generarlo aquí.
+
+    Si el trabajador todavía no lo empezó se cancela (se genera de forma sincrónica); si
+    ya está a mitad de camino se espera, que es más barato que empezar de nuevo.
+    """
+    future = pregen["future"]
+    key = pregen["key"]
+    pregen["key"] = None; pregen["future"] = None
+    if future is None or key != (run_seed, level):
+        if future is not None: future.cancel()
+        return None
+    if not future.done() and future.cancel():
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Error generando el piso {level} en segundo plano: {e}")
+        return None
+
+
+# ----------------------
+# PISOS SIN FIN (MAPAS POR BLOQUES)
+# ----------------------
+
+def generate_endless_floor(level, old_player_stats=None):
+    """Crea un piso de ENDLESS_MAP_SIZE x ENDLESS_MAP_SIZE respaldado por chunks.py.
+
+    Solo se generan los bloques cercanos al jugador, el de la salida y el de la tienda;
+    el resto aparece a medida que el jugador se acerca (ver stream_chunks).
+    """
+    global game_map, player, exit_pos, shop_pos, map_rooms
+    game_map = open_chunked_map(ENDLESS_MAP_FILE, ENDLESS_MAP_SIZE, ENDLESS_MAP_SIZE, seed=rngs["mapgen"].getrandbits(32))
+    map_rooms = []
+    enemies.clear()
+    occupancy.clear()
+
+    # El jugador empieza en la habitación del bloque central
+    n = game_map["chunks_x"]
+    ccx, ccy = n // 2, game_map["chunks_y"] // 2
+    room = chunk_room(game_map, ccx, ccy)
+    player = make_player((room[0] + room[2]) // 2, (room[1] + room[3]) // 2)
+    if old_player_stats:
+        player.update(old_player_stats) # Restaurar stats
+
+    # La salida está en un bloque lejano (más lejos en pisos más altos)
+    dist = max(2, min(n // 2 - 1, 2 + level))
+    mapgen = rngs["mapgen"]
+    side = mapgen.choice([(1,0),(-1,0),(0,1),(0,-1)])
+    offset = mapgen.randint(-dist, dist)
+    ecx = ccx + (side[0] * dist if side[0] else offset)
+    ecy = ccy + (side[1] * dist if side[1] else offset)
+    exit_pos = place_in_chunk_room(ecx, ecy, TILE_EXIT, level)
+
+    # Tienda en un bloque vecino
+    shop_pos = None
+    if mapgen.random() < 0.6 or level % 3 == 0:
+        dx, dy = mapgen.choice([(1,0),(-1,0),(0,1),(0,-1)])
+        shop_pos = place_in_chunk_room(ccx + dx, ccy + dy, TILE_SHOP, level)
+
+    stream_chunks()
+    mark_map_changed()
+    reset_visibility()
+    compute_visibility(player["x"], player["y"])
+
+    print(f"Nivel {level} (sin fin) generado. Salida en: {exit_pos}")
+    emit("new_level", level=level, exit_pos=exit_pos, shop_pos=shop_pos)
+
+def place_in_chunk_room(cx, cy, tile, level):
+    """Genera el bloque (cx, cy) si hace falta y pone 'tile' en el centro de su habitación."""
+    if ensure_chunk(game_map, cx, cy):
+        populate_chunks([(cx, cy)], level)
+    room = chunk_room(game_map, cx, cy)
+    x, y = (room[0] + room[2]) // 2, (room[1] + room[3]) // 2
+    set_tile(game_map, x, y, tile)
+    mark_dirty(game_map, x, y)
+    return (x, y)
+
+def populate_chunks(new_chunks, level):
+    """Coloca los enemigos de los bloques recién generados (entre 0 y 1 + level//3 por bloque)."""
+    spawns = rngs["spawns"]
+    for cx, cy in new_chunks:
+        room = chunk_room(game_map, cx, cy)
+        for _ in range(spawns.randint(0, min(3, 1 + level // 3))):
+            ex = spawns.randint(room[0], room[2]); ey = spawns.randint(room[1], room[3])
+            if abs(ex - player["x"]) + abs(ey - player["y"]) <= 3 or enemy_at(ex, ey): continue
+            if get_tile(game_map, ex, ey) != TILE_FLOOR: continue
+            enemy_level = level
+            if spawns.random() < 0.3:
+                enemy_level = level + 1
+            add_enemy(make_enemy(ex, ey, level=enemy_level, rng=spawns))
+
+def stream_chunks():
+    """En un piso sin fin, genera los bloques alrededor del jugador y coloca sus enemigos."""
+    if not is_chunked(game_map):
+        return
+    new_chunks = ensure_area(game_map, player["x"], player["y"], CHUNK_LOAD_RADIUS)
+    if new_chunks:
+        populate_chunks(new_chunks, level_number)
+        mark_map_changed()
+
+
+# ----------------------
+# SISTEMA DE NIVELES Y EXP
+# ----------------------
+
+def gain_experience(amount):
+    """Suma experiencia al jugador y verifica si debe subir de nivel."""
+    player['exp'] += amount
+    player['exp_to_next_level'] = max(10, player['level'] * 15)
+    
+    if player['exp'] >= player['exp_to_next_level']:
+        level_up()
+
+def level_up():
+    """Aumenta el nivel del jugador y mejora sus estadísticas de forma permanente."""
+    player['level'] += 1
+    player['exp'] = 0
+    player['exp_to_next_level'] = player['level'] * 25
+    
+    combat = rngs["combat"]
+    hp_increase = combat.randint(5, 8)
+    atk_increase = combat.randint(1, 2)
+    def_increase = combat.randint(1, 2)
+    
+    old_hp_max = player['hp_max']
+    player['hp_max'] += hp_increase
+    
+    # Mantiene el porcentaje de vida, no cura completamente
+    hp_percentage = player['hp'] / old_hp_max if old_hp_max > 0 else 1
+    player['hp'] = int(player['hp_max'] * hp_percentage)
+    
+    player['atk'] += atk_increase
+    player['def'] += def_increase
+    
+    combat_log_update(f"¡Nivel {player['level']}! +{hp_increase} HP, +{atk_increase} ATK, +{def_increase} DEF")
+
+def initialize_player_level_system():
+    """Inicializa las claves de nivelación en el diccionario del jugador."""
+    player['level'] = 1
+    player['exp'] = 0
+    player['exp_to_next_level'] = 15
+
+
+# ----------------------
+# MOVIMIENTO Y LÓGICA DE ENEMIGOS (IA)
+# ----------------------
+
+def try_move_player(dx, dy):
+    """Intenta mover al jugador. Verifica colisiones, inicio de combate, tienda y salida."""
+    if game_state != "exploracion":
+        return
+    if player.get("stun",0) > 0:
+        combat_log_update("Estás aturdido y no puedes moverte.")
+        return
+        
+    # Lógica de movimiento, actualización de visibilidad y detección de eventos (sin cambios)
+    nx = player['x'] + dx
+    ny = player['y'] + dy
+    if not is_walkable(game_map, nx, ny): return
+    player['x'], player['y'] = nx, ny
+    player['last_dir'] = (dx, dy) if (dx,dy) != (0,0) else player['last_dir']
+    player['vx'] = dx * 0.25
+    player['vy'] = dy * 0.25
+    emit("move", x=nx, y=ny)
+    stream_chunks()
+    compute_visibility(player['x'], player['y'])
+    
+    # Activar enemigos vistos
+    for e in enemies:
+        if get_tile(visible, e['x'], e['y']):
+            e['active'] = True
+
+    # Comprobar combate
+    e = enemy_at(player['x'], player['y'])
+    if e and e['active']:
+        start_combat(e)
+        return
+
+    # Comprobar salida/tienda (la interacción se maneja en el input)
+    if (player['x'], player['y']) == exit_pos:
+        new_level(level_number + 1, preserve_stats=True)
+
+def move_enemies_ai():
+    """Lógica de movimiento de todos los enemigos: persiguen al jugador si están activos o patrullan."""
+    ai = rngs["ai"]
+    for e in enemies:
+        if e.get('stun',0) > 0:
+            e['stun'] -= 1
+            continue
+            
+        d = abs(e['x'] - player['x']) + abs(e['y'] - player['y'])
+        
+        # Lógica de persecución (Aggro): baja por el campo de distancias compartido
+        if d <= e['aggro_range'] and (get_tile(visible, e['x'], e['y']) or e['active']):
+            e['active'] = True
+            field = get_chase_field()
+            w = game_map["w"]; h = game_map["h"]
+            here = field.get(e['y'] * w + e['x'], -1)
+            steps = []
+            for ax, ay in CHASE_DIRECTIONS:
+                nx = e['x'] + ax
+                ny = e['y'] + ay
+                if 0 <= nx < w and 0 <= ny < h:
+                    nd = field.get(ny * w + nx, -1)
+                    if nd >= 0 and (here < 0 or nd < here):
+                        steps.append((nd, ai.random(), ax, ay))
+            steps.sort()
+            for _, _, ax, ay in steps:
+                nx = e['x'] + ax
+                ny = e['y'] + ay
+                # Comprobar que no haya otro enemigo en la casilla
+                if enemy_at(nx, ny) is None:
+                    move_enemy(e, nx, ny)
+                    e['vx'] = ax * 0.2
+                    e['vy'] = ay * 0.2
+                    break
+            # Si se topa con el jugador, inicia combate
+            if e['x'] == player['x'] and e['y'] == player['y']:
+                start_combat(e)
+        
+        # Lógica de patrullaje (movimiento aleatorio)
+        else:
+            if ai.random() < 0.25:
+                ax,ay = e['patrol_dir']
+                if ai.random() < 0.2:
+                    e['patrol_dir'] = ai.choice([(1,0),(-1,0),(0,1),(0,-1)])
+                nx = e['x'] + e['patrol_dir'][0]
+                ny = e['y'] + e['patrol_dir'][1]
+                if is_walkable(game_map, nx, ny):
+                    if enemy_at(nx, ny) is None:
+                        move_enemy(e, nx, ny)
+
+
+# ----------------------
+# LÓGICA DE COMBATE CENTRAL
+# ----------------------
+
+def calc_damage(attacker, defender, power=1.0, is_crit=False):
+    """Calcula el daño final basado en ATK del atacante y DEF del defensor."""
+    base = attacker['atk'] * power
+    variance = rngs["combat"].uniform(0.85, 1.15)
+    raw = base * variance
+    mit = defender['def'] / (defender['def'] + 20) # Fórmula de mitigación por defensa
+    dmg = max(1, int(raw * (1 - mit)))
+    if is_crit:
+        dmg = int(dmg * 1.8)
+    return dmg
+
+def roll_hit_and_crit(attacker, defender):
+    """Determina si el ataque acierta (hit) y si es un golpe crítico (crit)."""
+    hit_chance = 0.75 + (attacker['atk'] - defender['def']) * 0.015
+    hit_chance = max(0.2, min(0.98, hit_chance))
+    combat = rngs["combat"]
+    if combat.random() > hit_chance:
+        return False, False # Fallo
+    dodge = max(0.02, min(0.35, (defender.get('speed',4) - attacker.get('speed',4)) * 0.03 + 0.05))
+    if combat.random() < dodge:
+        return False, False # Esquiva
+    crit_chance = 0.06 + (attacker['atk'] * 0.008)
+    crit = (combat.random() < crit_chance)
+    return True, crit # Acierto y estado crítico
+
+def apply_status_ticks(entity):
+    """Aplica los efectos de estado (como sangrado) al inicio del turno."""
+    if entity.get('bleed',0) > 0:
+        dmg = max(1, int(entity['hp_max'] * 0.03)) # Daño por sangrado (3% de HP max)
+        entity['hp'] -= dmg
+        spawn_floating_text(entity['x'] + rngs["cosmetics"].uniform(-0.2,0.2), entity['y'] - 0.2, f"-{dmg}", (200,100,40))
+        spawn_floating_text(entity['x'] + rngs["cosmetics"].uniform(-0.2,0.2), entity['y'] - 0.2, f"-{dmg}", (200,100,40))
+        entity['bleed'] -= 1
+
+def combat_attack(attacker, defender, power=1.0, status_apply=None):
+    """Ejecuta un ataque completo, calcula daño, aplica efectos y genera feedback visual."""
+    hit, crit = roll_hit_and_crit(attacker, defender)
+    if not hit:
+        return ("Falla el ataque.", 0, False)
+        
+    dmg = calc_damage(attacker, defender, power=power, is_crit=crit)
+    defender['hp'] -= dmg
+    emit("damage", target=defender, amount=dmg, crit=crit)
+    
+    log = f"Infliges {dmg} daño."
+    if crit: log = "¡Crítico! " + log
+    
+    if status_apply: # Aplica sangrado, etc.
+        for k,v in status_apply.items():
+            defender[k] = defender.get(k,0) + v
+            
+    # Feedback visual
+    spawn_particle(defender['x'], defender['y'], n=8, color=(255,80,40), size=2)
+    spawn_floating_text(defender['x'], defender['y'], f"-{dmg}", (255,200,120))
+    spawn_particle(defender['x'], defender['y'], n=8, color=(255,80,40), size=2)
+    spawn_floating_text(defender['x'], defender['y'], f"-{dmg}", (255,200,120))
+    return (log, dmg, True)
+
+def start_combat(enemy):
+    """Cambia el estado del juego a 'combate', selecciona el enemigo activo e inicializa el turno."""
+    global game_state, active_enemy, combat_turn, combat_log, escape_chance
+    game_state = "combate"
+    active_enemy = enemy
+    combat_turn = "player"
+    enemy["current_dialogue"] = rngs["cosmetics"].choice(enemy["dialogues"])
+    combat_log = f"Combate contra {enemy['type'].capitalize()} nivel {enemy['level']}"
+    escape_chance = 0.45
+    emit("combat_start", enemy=enemy)
+
+def end_combat(victor):
+    """Finaliza el combate, otorga recompensas al ganador (player) o establece Game Over (enemy)."""
+    global game_state, active_enemy, combat_log
+    global enemies_killed, total_score
+    
+    if victor == 'player':
+        enemies_killed += 1
+        enemy_points = active_enemy['level']
+        total_score += enemy_points
+        exp_gained = max(5, active_enemy['level'] * 6)
+        gain_experience(exp_gained)
+        gain_experience(exp_gained)
+        g = active_enemy.get('gold_drop', 0)
+        player['gold'] += g
+        
+        combat_log = f"Has derrotado al enemigo. +{exp_gained} EXP (+{g} oro)"
+        spawn_floating_text(active_enemy['x'], active_enemy['y'] - 0.5, f"+{enemy_points} pts", (100, 200, 255))
+        spawn_particle(active_enemy['x'], active_enemy['y'], n=12, color=(255,200,80), size=3)
+        spawn_floating_text(active_enemy['x'], active_enemy['y'], f"+{g} oro", (255,220,100))
+        spawn_floating_text(active_enemy['x'], active_enemy['y'] - 0.5, f"+{exp_gained} EXP", (100,200,255))
+        spawn_floating_text(active_enemy['x'], active_enemy['y'] - 0.5, f"+{enemy_points} pts", (100, 200, 255))
+        spawn_particle(active_enemy['x'], active_enemy['y'], n=12, color=(255,200,80), size=3)
+        spawn_floating_text(active_enemy['x'], active_enemy['y'], f"+{g} oro", (255,220,100))
+        spawn_floating_text(active_enemy['x'], active_enemy['y'] - 0.5, f"+{exp_gained} EXP", (100,200,255))
+        
+        remove_enemy(active_enemy)
+        emit("kill", enemy=active_enemy, exp=exp_gained, gold=g)
+        active_enemy = None
+        game_state = "exploracion"
+        if player_nickname: save_game()
+            
+    elif victor == 'enemy':
+        if player_nickname: save_leaderboard_entry()
+        try: # Eliminar el archivo de guardado al morir
+            delete_saves()
+        except Exception as e:
+            print(f"Error eliminando partida: {e}")
+            
+        combat_log = "Has sido derrotado..."
+        game_state = "gameover"
+        emit("gameover", level=level_number, score=total_score, kills=enemies_killed)
+
+def handle_player_combat_input(action):
+    """Maneja las acciones del jugador durante el turno de combate.
+
+    action: "attack", "defend", "flee", "potion", "arrow" o "strike" (teclas 1, 2, 3, P, A, Z).
+    """
+    global combat_turn, combat_log, active_enemy, game_state, escape_chance
+    
+    if combat_turn != "player" or not active_enemy: return
+    if player.get('stun',0) > 0: # Aturdimiento
+        combat_log_update("Estás aturdido, pierdes el turno.")
+        player['stun'] -= 1
+        combat_turn = "enemy"
+        return
+        
+    # Lógica por acción (se mantiene el código original con la misma funcionalidad)
+    if action == "attack":
+        log, dmg, hit = combat_attack(player, active_enemy, power=1.0)
+        combat_log = log
+        if active_enemy['hp'] <= 0: end_combat('player')
+        else: combat_turn = "enemy"
+    elif action == "defend":
+        combat_log = "Te defiendes: +6 defensa por 1 turno."
+        player['def_backup'] = player['def']
+        player['def'] += 6
+        player['def_turns'] = 1
+        combat_turn = "enemy"
+    elif action == "flee":
+        if rngs["combat"].random() < escape_chance:
+            # Lógica de huida exitosa
+            combat_log = "¡Huyes exitosamente!"
+            for dx,dy in [(0,-1),(0,1),(-1,0),(1,0)]:
+                nx = player['x'] + dx; ny = player['y'] + dy
+                if is_walkable(game_map, nx, ny) and enemy_at(nx, ny) is None:
+                    player['x'], player['y'] = nx, ny
+                    stream_chunks()
+                    break
+            active_enemy = None; game_state = "exploracion"; combat_turn = "player"; escape_chance = 0.45
+        else:
+            combat_log = f"No puedes huir! ({int(escape_chance*100)}% chance)"
+            escape_chance = min(escape_chance + 0.15, 0.9) # Aumentar chance de huida
+            combat_turn = "enemy"
+    elif action == "potion":
+        if player['potions'] > 0:
+            player['potions'] -= 1
+            heal = min(player['hp_max'] - player['hp'], 20)
+            player['hp'] += heal
+            combat_log = f"Usas una poción y recuperas {heal} HP."
+            spawn_floating_text(player['x'], player['y'], f"+{heal}", (120,255,120))
+            spawn_floating_text(player['x'], player['y'], f"+{heal}", (120,255,120))
+            combat_turn = "enemy"
+        else: combat_log = "No tienes pociones."
+    elif action == "arrow":
+        if player['cd_arrow'] > 0:
+            combat_log = f"Flecha en cooldown ({player['cd_arrow']})"
+        else:
+            dx,dy = player['last_dir']; hit_any = False
+            if dx == 0 and dy == 0: dx,dy = (0,-1)
+            for dist in range(1,7): # Raycast para la flecha
+                tx = player['x'] + dx*dist; ty = player['y'] + dy*dist
+                if not is_walkable(game_map, tx, ty): break
+                target = enemy_at(tx, ty)
+                if target:
+                    log, dmg, hit = combat_attack(player, target, power=0.9)
+                    combat_log = f"Flecha: {log}"; player['cd_arrow'] = 4; hit_any = True
+                    if target['hp'] <= 0:
+                        remove_enemy(target)
+                    break
+            if not hit_any: combat_log = "Flecha no impacta a nadie."
+            combat_turn = "enemy"
+    elif action == "strike":
+        if player['cd_strike'] > 0:
+            combat_log = f"Golpe fuerte en cooldown ({player['cd_strike']})"
+        else:
+            dice = rngs["combat"].randint(1,20)
+            if dice == 1: # Pifia crítica
+                selfdmg = max(1, int(player['hp_max']*0.06)); player['hp'] -= selfdmg; player['stun'] = 1
+                combat_log = f"Pifia y te lastimas {selfdmg} HP y quedas aturdido."
+            else:
+                hit, crit = roll_hit_and_crit(player, active_enemy)
+                if not hit: combat_log = "Golpe fuerte falla."
+                else:
+                    dmg = calc_damage(player, active_enemy, power=1.8, is_crit=crit)
+                    active_enemy['hp'] -= dmg
+                    combat_log = f"Golpe fuerte causa {dmg} daño."
+                    spawn_floating_text(active_enemy['x'], active_enemy['y'], f"-{dmg}", (255,200,120))
+                    spawn_floating_text(active_enemy['x'], active_enemy['y'], f"-{dmg}", (255,200,120))
+                    if rngs["combat"].random() < 0.25: # Aplicar sangrado
+                        active_enemy['bleed'] = active_enemy.get('bleed',0) + 2
+                        combat_log += " (sangrado)"
+                player['cd_strike'] = 5
+                if active_enemy['hp'] <= 0: end_combat('player'); return
+            combat_turn = "enemy"
+
+def enemy_turn():
+    """Ejecuta el turno del enemigo activo (IA)."""
+    global combat_turn, combat_log
+    if not active_enemy: combat_turn = "player"; return
+    if active_enemy.get('stun',0) > 0: # Salta turno por aturdimiento
+        combat_log = "El enemigo está aturdido y pierde el turno."
+        active_enemy['stun'] -= 1; combat_turn = "player"; return
+        
+    combat = rngs["combat"]
+    choice = combat.random()
+    # Lógica de decisión del enemigo (75% ataque normal, 15% sangrado, 10% aturdir)
+    if choice < 0.75:
+        log, dmg, hit = combat_attack(active_enemy, player, power=1.0)
+        combat_log = "Enemigo: " + log
+    elif choice < 0.9:
+        log, dmg, hit = combat_attack(active_enemy, player, power=0.9, status_apply={"bleed":2})
+        combat_log = "Enemigo aplica sangrado! " + log
+    else:
+        if combat.random() < 0.4:
+            player['stun'] = 1
+            combat_log = "Enemigo aturde!"
+        else:
+            log, dmg, hit = combat_attack(active_enemy, player, power=0.6)
+            combat_log = "Enemigo intenta aturdir y falla en parte. " + log
+
+    # Manejar estado de defensa del jugador
+    if player.get('def_turns',0) > 0:
+        player['def_turns'] -= 1
+        if player['def_turns'] <= 0 and 'def_backup' in player:
+            player['def'] = player['def_backup']; del player['def_backup']
+
+    # Aplicar ticks de estado
+    apply_status_ticks(player)
+    apply_status_ticks(active_enemy)
+
+    # Reducir Cooldowns y Buffs
+    if player['cd_arrow'] > 0: player['cd_arrow'] -= 1
+    if player['cd_strike'] > 0: player['cd_strike'] -= 1
+    if player.get('buff_turns',0) > 0:
+        player['buff_turns'] -= 1
+        if player['buff_turns'] <= 0: player['attack_buff'] = 0
+
+    # Verificar si el combate debe terminar
+    if player['hp'] <= 0: end_combat('enemy')
+    elif active_enemy['hp'] <= 0: end_combat('player')
+    else: combat_turn = "player"
+
+def combat_log_update(text):
+    """Actualiza el mensaje del log de combate y lo muestra por COMBAT_LOG_MS."""
+    global combat_log, combat_log_visible
+    combat_log = text
+    combat_log_visible = True
+    schedule(timers, COMBAT_LOG_MS, hide_combat_log, key="combat_log")
+
+def hide_combat_log():
+    """Oculta el log de combate del mapa (el texto queda para la pantalla de combate)."""
+    global combat_log_visible
+    combat_log_visible = False
+
+
+# ----------------------
+# TIENDA
+# ----------------------
+SHOP_ITEMS = [
+    {"name":"Poción de Vida", "type":"potion", "heal":25, "price": 15},
+    {"name":"Poción Grande", "type":"potion", "heal":40, "price": 25},
+    {"name":"Elixir de Fuerza", "type":"buff", "atk_bonus":6, "turns":8, "price": 35}
+]
+
+SHOP_WELCOME = "Bienvenido. 1/2/3 comprar, Q salir."
+
+shop_open = False
+shop_message = ""
+shop_message_visible = False   # Los mensajes de compra se ocultan solos; la bienvenida no
+
+def open_shop():
+    """Cambia el estado a 'shop' e inicializa el menú de la tienda."""
+    global shop_open, shop_message, game_state, shop_message_visible
+    shop_open = True
+    game_state = "shop"
+    shop_message = SHOP_WELCOME
+    shop_message_visible = True
+
+def show_shop_message():
+    """Muestra el mensaje actual de la tienda por SHOP_MESSAGE_MS."""
+    global shop_message_visible
+    shop_message_visible = True
+    schedule(timers, SHOP_MESSAGE_MS, hide_shop_message, key="shop_message")
+
+def hide_shop_message():
+    """Oculta el mensaje de compra (la bienvenida sigue visible)."""
+    global shop_message_visible
+    shop_message_visible = shop_message == SHOP_WELCOME
+
+def shop_buy(idx):
+    """Procesa la compra de un ítem de la tienda (teclas 1, 2, 3)."""
+    global shop_message
+    if idx < 0 or idx >= len(SHOP_ITEMS): return
+    item = SHOP_ITEMS[idx]
+    if player['gold'] < item['price']:
+        shop_message = "No tienes suficiente oro."
+        show_shop_message()
+        return
+        
+    player['gold'] -= item['price']
+    emit("buy", item=item['name'], price=item['price'])
+    if item['type'] == 'potion':
+        if item["heal"] > 39:
+            player['potions'] += 2
+        else:
+            player['potions'] += 1
+    elif item['type'] == 'buff':
+        player['attack_buff'] += item['atk_bonus']
+        player['buff_turns'] = item['turns']
+        shop_message = f"Compraste {item['name']} (+{item['atk_bonus']} atk por {item['turns']} turnos)."
+    show_shop_message()
+
+def close_shop():
+    """Cierra el menú de la tienda y regresa al estado de 'exploracion'."""
+    global shop_open, shop_message, game_state, shop_message_visible
+    shop_open = False
+    game_state = "exploracion"
+    shop_message = ""
+    shop_message_visible = False
+
+
+# ----------------------
+# EFECTOS VISUALES (SOLO DATOS)
+# ----------------------
+
+def spawn_particle(x, y, n=6, color=(255,200,100), size=3, speed=1.2, life=18):
+    """Genera una explosión de partículas en las coordenadas (x, y)."""
+    if not effects_enabled: return
+    spawn_burst(particles, x, y, n=n, color=color, size=size, speed=speed, life=life)
+
+def spawn_floating_text(x, y, text, color=(255,255,255), life=40):
+    """Crea un texto que flota hacia arriba (usado para daño, oro, EXP)."""
+    if not effects_enabled: return
+    floating_texts.append({
+        "x": x,
+        "y": y,
+        "text": str(text),
+        "color": color,
+        "life": life,
+        "vy": -0.4 - rngs["cosmetics"].random()*0.6,
+        "prev_y": y
+    })
+
+def update_particles_and_texts():
+    """Avanza un paso de simulación las partículas y los textos flotantes (guarda la posición anterior)."""
+    update_pool(particles)
+    for ft in floating_texts:
+        ft['prev_y'] = ft['y']
+        ft['y'] += ft['vy'] * 0.02; ft['life'] -= 1
+    floating_texts[:] = [ft for ft in floating_texts if ft['life'] > 0]
+
+def update_animations():
+    """Avanza un paso de simulación los empujones visuales (vx, vy) del jugador y los enemigos.
+
+    Cada paso guarda el valor anterior en pvx/pvy (para interpolar al dibujar) y reduce el
+    empujón con ANIM_DECAY hasta que vuelve a cero.
+    """
+    for ent in [player] + enemies:
+        ent['pvx'] = ent['vx']; ent['pvy'] = ent['vy']
+        if ent['vx'] or ent['vy']:
+            ent['vx'] *= ANIM_DECAY; ent['vy'] *= ANIM_DECAY
+            if abs(ent['vx']) < 0.01 and abs(ent['vy']) < 0.01:
+                ent['vx'] = 0.0; ent['vy'] = 0.0
+
+
+# ----------------------
+# ACCIONES DE EXPLORACIÓN
+# ----------------------
+
+def use_potion_exploring():
+    """Bebe una poción fuera de combate (cura hasta 20 HP)."""
+    if player['potions'] > 0 and player['hp'] < player['hp_max']:
+        heal = min(player['hp_max'] - player['hp'], 20)
+        player['hp'] += heal; player['potions'] -= 1
+        spawn_floating_text(player['x'], player['y'], f"+{heal}", (120,255,120))
+        spawn_floating_text(player['x'], player['y'], f"+{heal}", (120,255,120))
+        emit("heal", amount=heal)
+
+def shoot_arrow_exploring():
+    """Dispara una flecha en la última dirección del jugador sin entrar en combate."""
+    dx,dy = player['last_dir']
+    if player['cd_arrow'] == 0:
+        if dx == 0 and dy == 0: dx,dy = (0,-1)
+        hit_any = False
+        for step in range(1,7):
+            tx = player['x'] + dx*step; ty = player['y'] + dy*step
+            if not is_walkable(game_map, tx, ty): break
+            target = enemy_at(tx, ty)
+            if target:
+                log, dmg, hit = combat_attack(player, target, power=0.9)
+                spawn_floating_text(target['x'], target['y'], f"-{dmg}", (255,200,120))
+                spawn_floating_text(target['x'], target['y'], f"-{dmg}", (255,200,120))
+                player['cd_arrow'] = 4; hit_any = True; break
+        if not hit_any: combat_log_update("Flecha no impacta a nadie.")
+
+def strike_exploring():
+    """Golpe fuerte en exploración: entra a combate si hay un enemigo en la casilla del jugador."""
+    e = enemy_at(player['x'], player['y'])
+    if e:
+        start_combat(e); handle_player_combat_input("strike")
+
+
+# ----------------------
+# API DE SIMULACIÓN (STEP)
+# ----------------------
+
+MOVES = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+COMBAT_ACTIONS = ("attack", "defend", "flee", "potion", "arrow", "strike")
+SHOP_ACTIONS = {"buy1": 0, "buy2": 1, "buy3": 2}
+
+def new_game(nickname="", endless=False, seed=None):
+    """Empieza una partida nueva en el piso 1. Sin nickname no se guarda nada en disco.
+
+    Con endless=True los pisos son mapas grandes por bloques (ENDLESS_MAP_SIZE). Con la misma
+    'seed' y las mismas acciones la partida se repite igual.
+    """
+    global player_nickname, enemies_killed, total_score, game_state, level_number, endless_mode, combat_log_visible
+    global next_enemy_uid, combat_turn, active_enemy, escape_chance
+    player_nickname = nickname; enemies_killed = 0; total_score = 0; endless_mode = endless
+    next_enemy_uid = 1  # Los uid también se repiten con la semilla (entran en state_hash)
+    # Al morir el combate queda a medias (turno del enemigo): la partida nueva no lo hereda
+    combat_turn = "player"; active_enemy = None; escape_chance = 0.45
+    clear_scheduler(timers); combat_log_visible = False
+    reset_journal()
+    seed_run(seed)
+    new_level(1, preserve_stats=False, generate_new_level=True)
+    game_state = "exploracion"; level_number = 1
+
+def restore_game(saved_data):
+    """Restaura una partida a partir de los datos devueltos por load_game()."""
+    global player_nickname, enemies_killed, total_score, game_map, exit_pos, shop_pos
+    global player, level_number, game_state, endless_mode, combat_log_visible, next_enemy_uid
+    player_nickname = saved_data.get('player_nickname', 'Jugador')
+    clear_scheduler(timers); combat_log_visible = False
+    # Los guardados viejos no tienen semilla: se sigue con una nueva
+    seed_run(saved_data.get('run_seed'), "resume", saved_data['level_reached'])
+    enemies_killed = saved_data['enemies_killed']; total_score = saved_data['total_score']
+    if game_map is not None and is_chunked(game_map):
+        close_chunked_map(game_map)
+    endless_mode = bool(saved_data.get('map_file'))
+    if endless_mode:
+        game_map = reopen_chunked_map(saved_data['map_file'])
+    elif saved_data.get('tiles') is not None:
+        w, h = saved_data['map_size']  # Formato binario: las casillas ya vienen como bytearray
+        game_map = {"w": w, "h": h, "cells": saved_data['tiles']}
+    else:
+        game_map = grid_from_rows(saved_data['game_map'])
+    exit_pos = tuple(saved_data['exit_pos']); mark_map_changed()
+    shop_pos = tuple(saved_data['shop_pos']) if saved_data['shop_pos'] else None
+    player_data = saved_data['player']; player = make_player(player_data['x'], player_data['y']); player.update(player_data)
+    enemies[:] = [enemy_from_save(enemy_data) for enemy_data in saved_data['enemies']]
+    next_enemy_uid = max([next_enemy_uid] + [e['uid'] + 1 for e in enemies])
+    reset_journal()
+    rebuild_occupancy()
+    reset_visibility()
+    if saved_data.get('explored') is not None:
+        explored['cells'][:] = saved_data['explored']
+    compute_visibility(player["x"], player["y"])
+    level_number = saved_data['level_reached']; game_state = "exploracion"
+    pregenerate_floor(level_number + 1)
+
+def step(action, auto_enemy_turn=True):
+    """Aplica una acción del jugador y devuelve la lista de eventos que produjo.
+
+    Exploración: "up", "down", "left", "right", "shop", "potion", "arrow", "strike", "next_level".
+    Combate: "attack", "defend", "flee", "potion", "arrow", "strike".
+    Tienda: "buy1", "buy2", "buy3", "leave_shop".
+    Con auto_enemy_turn=False el turno del enemigo queda pendiente (combat_turn == "enemy")
+    y quien llama debe ejecutar enemy_turn().
+    """
+    events.clear()
+    if game_state == "exploracion":
+        if action in MOVES:
+            try_move_player(*MOVES[action]); move_enemies_ai()
+        elif action == "shop":
+            if shop_pos and (player['x'], player['y']) == shop_pos: open_shop()
+        elif action == "potion": use_potion_exploring()
+        elif action == "arrow": shoot_arrow_exploring()
+        elif action == "strike": strike_exploring()
+        elif action == "next_level": new_level(level_number + 1, preserve_stats=True, generate_new_level=True)
+    elif game_state == "combate":
+        if action in COMBAT_ACTIONS:
+            handle_player_combat_input(action)
+            if combat_turn == "enemy" and auto_enemy_turn:
+                enemy_turn()
+    elif game_state == "shop":
+        if action == "leave_shop": close_shop()
+        elif action in SHOP_ACTIONS: shop_buy(SHOP_ACTIONS[action])
+    return list(events)
+
+# Lo que entra en state_hash: todo lo que decide la partida y nada cosmético
+# (animaciones, partículas, textos flotantes, mensajes)
+HASHED_PLAYER_KEYS = ("x", "y", "hp", "hp_max", "atk", "def", "gold", "potions", "attack_buff", "stun",
+                      "cd_strike", "cd_arrow", "last_dir", "level", "exp", "exp_to_next_level")
+HASHED_ENEMY_KEYS = ("uid", "x", "y", "hp", "hp_max", "atk", "def", "level", "type", "active", "stun", "patrol_dir")
+HASHED_STREAMS = ("mapgen", "spawns", "ai", "combat")
+
+def state_hash():
+    """Resumen de 32 bits (CRC32) del estado de la simulación, para comparar partidas turno a turno.
+
+    Incluye el estado interno de los generadores que deciden el juego, así una diferencia se
+    nota en el mismo turno aunque todavía no haya movido nada. En pisos sin fin no se recorre
+    el mapa (vive en disco); alcanza con el resto del estado.
+    """
+    summary = (level_number, game_state, combat_turn, active_enemy["uid"] if active_enemy else None,
+               tuple(player[k] for k in HASHED_PLAYER_KEYS),
+               [tuple(e[k] for k in HASHED_ENEMY_KEYS) for e in enemies],
+               exit_pos, shop_pos, enemies_killed, total_score)
+    h = zlib.crc32(repr(summary).encode("utf-8"))
+    if not is_chunked(game_map):
+        h = zlib.crc32(game_map["cells"], h)
+    for name in HASHED_STREAMS:
+        h = zlib.crc32(array("I", rngs[name].getstate()[1]).tobytes(), h)
+    return h
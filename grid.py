@@ -0,0 +1,77 @@
+# grid.py
+# Grilla compacta para mapas (sin clases): un diccionario con ancho, alto y un bytearray plano.
+# Cada casilla ocupa un byte; la casilla (x, y) está en cells[y * w + x].
+# Las propiedades de cada tipo de casilla se consultan en tablas (WALKABLE, OPAQUE).
+
+# ----------------------
+# TIPOS DE CASILLA Y TABLAS DE PROPIEDADES
+# ----------------------
+TILE_FLOOR = 0
+TILE_WALL = 1
+TILE_SHOP = 2
+TILE_EXIT = 3
+
+# Tablas indexadas por tipo de casilla (256 entradas para poder indexar cualquier byte)
+WALKABLE = bytes([1, 0, 1, 1] + [0] * 252)
+OPAQUE = bytes([0, 1, 0, 0] + [1] * 252)
+
+
+# ----------------------
+# CREACIÓN Y CONVERSIÓN
+# ----------------------
+
+def make_grid(width, height, fill=TILE_WALL):
+    """Crea una grilla de width x height con todas las casillas en 'fill'."""
+    return {"w": width, "h": height, "cells": bytearray([fill]) * (width * height)}
+
+def copy_grid(grid):
+    """Devuelve una copia independiente de la grilla."""
+    return {"w": grid["w"], "h": grid["h"], "cells": bytearray(grid["cells"])}
+
+def grid_from_rows(rows):
+    """Convierte una lista de listas de enteros (formato antiguo) en una grilla."""
+    height = len(rows)
+    width = len(rows[0]) if rows else 0
+    grid = make_grid(width, height)
+    cells = grid["cells"]
+    for y, row in enumerate(rows):
+        cells[y * width:(y + 1) * width] = bytes(row)
+    return grid
+
+
+# ----------------------
+# ACCESO A CASILLAS
+# ----------------------
+# En los bucles críticos conviene leer grid["cells"] y grid["w"] en variables locales
+# y usar WALKABLE[cells[y * w + x]] directamente en lugar de estas funciones.
+
+def get_tile(grid, x, y):
+    """Devuelve el tipo de casilla en (x, y)."""
+    return grid["cells"][y * grid["w"] + x]
+
+def set_tile(grid, x, y, tile):
+    """Cambia el tipo de casilla en (x, y)."""
+    grid["cells"][y * grid["w"] + x] = tile
+
+def is_walkable(grid, x, y):
+    """Indica si (x, y) está dentro del mapa y se puede caminar."""
+    return 0 <= x < grid["w"] and 0 <= y < grid["h"] and WALKABLE[grid["cells"][y * grid["w"] + x]] == 1
+
+def fill_rect(grid, x1, y1, x2, y2, tile):
+    """Rellena el rectángulo [x1..x2] x [y1..y2] (inclusive, recortado a la grilla) con 'tile'."""
+    w = grid["w"]; cells = grid["cells"]
+    x1 = max(0, x1); y1 = max(0, y1); x2 = min(w - 1, x2); y2 = min(grid["h"] - 1, y2)
+    if x1 > x2:
+        return
+    run = bytes([tile]) * (x2 - x1 + 1)
+    for y in range(y1, y2 + 1):
+        cells[y * w + x1:y * w + x2 + 1] = run
+
+def row_view(grid, y):
+    """Vista sin copia (memoryview) de la fila y; escribir en ella modifica la grilla."""
+    w = grid["w"]
+    return memoryview(grid["cells"])[y * w:(y + 1) * w]
+
+def column_view(grid, x):
+    """Vista con paso w (memoryview) de la columna x; escribir en ella modifica la grilla."""
+    return memoryview(grid["cells"])[x::grid["w"]]
@@ -0,0 +1,146 @@
+# leaderboard.py
+# Leaderboard en SQLite (biblioteca estándar, sin clases).
+#
+# Cada partida terminada es una fila de la tabla 'runs'; no se descarta nada. Los índices
+# sobre el puntaje y sobre (nickname, puntaje) permiten pedir el top-k, el mejor puntaje de
+# un jugador o la posición de un puntaje sin leer ni ordenar toda la historia.
+# Las inserciones son transacciones de SQLite, así que dos instancias del juego que terminan
+# a la vez no pierden entradas (el modo WAL deja leer mientras otra escribe).
+#
+# La primera vez que se abre la base se importan las entradas de leaderboard.json (el
+# formato anterior), dentro de la misma transacción que crea las tablas.
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+LEADERBOARD_DB = "leaderboard.db"
+LEGACY_LEADERBOARD_FILE = "leaderboard.json"
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_S = 5.0   # Cuánto esperar si otra instancia tiene la base bloqueada
+
+connection = None      # Conexión abierta (se crea al primer uso)
+local_writes = 0       # Inserciones hechas por esta instancia (ver data_stamp)
+
+
+# ----------------------
+# CONEXIÓN Y ESQUEMA
+# ----------------------
+
+def get_connection(path=LEADERBOARD_DB):
+    """Devuelve la conexión a la base (la abre y crea el esquema la primera vez)."""
+    global connection
+    if connection is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        ensure_schema(conn)
+        connection = conn
+    return connection
+
+def close_connection():
+    """Cierra la conexión (la próxima consulta la vuelve a abrir)."""
+    global connection
+    if connection is not None:
+        connection.close()
+        connection = None
+
+def ensure_schema(conn, legacy_path=LEGACY_LEADERBOARD_FILE):
+    """Crea tablas e índices si faltan e importa el leaderboard JSON una sola vez."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")   # Otra instancia que llegue a la vez espera aquí
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            conn.execute("""CREATE TABLE IF NOT EXISTS runs (
+                                id INTEGER PRIMARY KEY,
+                                nickname TEXT NOT NULL,
+                                score INTEGER NOT NULL,
+                                level_reached INTEGER NOT NULL,
+                                enemies_killed INTEGER NOT NULL,
+                                timestamp TEXT NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_score ON runs (score DESC, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_nickname_score ON runs (nickname, score DESC)")
+            imported = import_legacy(conn, legacy_path)
+            if imported:
+                print(f"Leaderboard: {imported} entradas importadas de {legacy_path}")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def import_legacy(conn, legacy_path):
+    """Copia a la base las entradas del leaderboard.json anterior. Devuelve cuántas importó."""
+    if not os.path.exists(legacy_path):
+        return 0
+    try:
+        with open(legacy_path, 'r') as f:
+            entries = json.load(f)
+    except Exception as e:
+        print(f"Error leyendo {legacy_path}: {e}")
+        return 0
+    rows = [(e.get('nickname', 'Jugador'), int(e.get('score', 0)), int(e.get('level_reached', 1)),
+             int(e.get('enemies_killed', 0)), e.get('timestamp') or datetime.now().isoformat())
+            for e in entries if isinstance(e, dict)]
+    conn.executemany("INSERT INTO runs (nickname, score, level_reached, enemies_killed, timestamp) "
+                     "VALUES (?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+# ----------------------
+# ESCRITURA
+# ----------------------
+
+def add_entry(nickname, score, level_reached, enemies_killed, timestamp=None):
+    """Agrega una partida terminada. Devuelve la posición que ocupa su puntaje (1 = primero)."""
+    global local_writes
+    conn = get_connection()
+    conn.execute("INSERT INTO runs (nickname, score, level_reached, enemies_killed, timestamp) "
+                 "VALUES (?, ?, ?, ?, ?)",
+                 (nickname, score, level_reached, enemies_killed, timestamp or datetime.now().isoformat()))
+    local_writes += 1
+    return rank_of_score(score)
+
+
+# ----------------------
+# CONSULTAS
+# ----------------------
+
+def entry_from_row(row):
+    """Convierte una fila de 'runs' en el diccionario de siempre (mismas claves que el JSON)."""
+    return {
+        'nickname': row['nickname'],
+        'score': row['score'],
+        'level_reached': row['level_reached'],
+        'enemies_killed': row['enemies_killed'],
+        'timestamp': row['timestamp'],
+    }
+
+def top_scores(k=10):
+    """Las k mejores partidas, de mayor a menor puntaje (recorre solo k entradas del índice)."""
+    rows = get_connection().execute(
+        "SELECT * FROM runs ORDER BY score DESC, id LIMIT ?", (k,)).fetchall()
+    return [entry_from_row(r) for r in rows]
+
+def best_for(nickname):
+    """La mejor partida de 'nickname' o None (una búsqueda en el índice por nickname)."""
+    row = get_connection().execute(
+        "SELECT * FROM runs WHERE nickname = ? ORDER BY score DESC, id LIMIT 1", (nickname,)).fetchone()
+    return entry_from_row(row) if row else None
+
+def rank_of_score(score):
+    """Posición que tendría 'score' en el leaderboard (1 + cuántas partidas lo superan).
+
+    Busca en el índice de puntajes y cuenta solo las entradas mejores, sin tocar la tabla.
+    """
+    return 1 + get_connection().execute("SELECT COUNT(*) FROM runs WHERE score > ?", (score,)).fetchone()[0]
+
+def count_runs():
+    """Cantidad total de partidas registradas."""
+    return get_connection().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+def data_stamp():
+    """Valor que cambia cuando cambia la base (por esta u otra instancia): sirve para cachear consultas."""
+    return (get_connection().execute("PRAGMA data_version").fetchone()[0], local_writes)
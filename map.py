@@ -1,24 +1,14 @@
+from grid import TILE_FLOOR, TILE_WALL, make_grid, fill_rect, grid_from_rows
+
 def generar_cuadrado(lado: int):
-    matriz = []
-    for i in range(lado):
-        fila = []
-        for j in range(lado):
-            if i == 0 or i == lado - 1 or j == 0 or j == lado - 1:
-                fila.append((1,False))
-            else:
-                fila.append((0,False))
-        matriz.append(fila)
-    return matriz
+    """Crea una grilla cuadrada de suelo rodeada por paredes."""
+    grilla = make_grid(lado, lado, TILE_WALL)
+    fill_rect(grilla, 1, 1, lado - 2, lado - 2, TILE_FLOOR)
+    return grilla
 
 def transformar_matriz(matriz):
-    nueva_matriz = []
-    for fila in matriz:
-        nueva_fila = []
-        for valor in fila:
-            nueva_fila.append((valor, False))
-        nueva_matriz.append(nueva_fila)
-    return nueva_matriz
-
+    """Convierte una matriz de enteros (lista de listas) en una grilla compacta."""
+    return grid_from_rows(matriz)
 example_map = [
     [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],
     [1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1],
@@ -1,8 +1,9 @@
 import pygame
 import sys
-import json
-import os
-from datetime import datetime
+
+import core
+from leaderboard import data_stamp
+from text_cache import render_text
 
 # Inicializar Pygame
 pygame.init()
@@ -38,9 +39,20 @@ button_font = pygame.font.Font(None, 32)
 small_font = pygame.font.Font(None, 24)
 input_font = pygame.font.Font(None, 28)
 
-# Archivos de guardado
-SAVE_FILE = "save_game.json"
-LEADERBOARD_FILE = "leaderboard.json"
+# Antorchas animadas del fondo: (x, y, tamaño)
+TORCHES = [(80, 300, 15), (SCREEN_W - 80, 350, 15)]
+
+# Fondo estático ya dibujado (todo menos las llamas de las antorchas)
+static_background = None
+
+# Leaderboard en memoria: se vuelve a consultar solo si cambió la base
+LEADERBOARD_CHECK_MS = 500   # Cada cuánto se mira el archivo mientras el panel está abierto
+leaderboard_cache = {"stamp": None, "entries": [], "checked_at": None}
+
+# Panel del leaderboard ya dibujado y los datos con los que se dibujó
+leaderboard_panel = None
+leaderboard_panel_data = None
+leaderboard_overlay = None
 
 
 # ---- Button helpers (no classes) ----
@@ -71,7 +83,7 @@ def draw_button(btn, surface):
                          (rect.left + 5, rect.top + 5),
                          (rect.right - 5, rect.top + 5), 2)
 
-    text_surface = button_font.render(btn['text'], True, text_color)
+    text_surface = render_text(button_font, btn['text'], text_color)
     text_rect = text_surface.get_rect(center=rect.center)
     surface.blit(text_surface, text_rect)
 
@@ -112,54 +124,37 @@ def draw_inputbox(inputbox, surface):
     pygame.draw.rect(surface, DARK_BLUE, rect, border_radius=5)
     pygame.draw.rect(surface, color, rect, 2, border_radius=5)
 
-    text_surface = input_font.render(inputbox.get('text', ''), True, SILVER)
+    text_surface = render_text(input_font, inputbox.get('text', ''), SILVER)
     surface.blit(text_surface, (rect.x + 10, rect.y + 8))
 
 # Funciones de guardado
 def load_game():
-    try:
-        if os.path.exists(SAVE_FILE):
-            with open(SAVE_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return None
-
-def save_leaderboard_entry(nickname, score, level_reached, enemies_killed):
-    try:
-        leaderboard = []
-        if os.path.exists(LEADERBOARD_FILE):
-            with open(LEADERBOARD_FILE, 'r') as f:
-                leaderboard = json.load(f)
-        
-        entry = {
-            'nickname': nickname,
-            'score': score,
-            'level_reached': level_reached,
-            'enemies_killed': enemies_killed,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        leaderboard.append(entry)
-        # Ordenar por puntaje (descendente)
-        leaderboard.sort(key=lambda x: x['score'], reverse=True)
-        # Mantener solo los top 10
-        leaderboard = leaderboard[:10]
-        
-        with open(LEADERBOARD_FILE, 'w') as f:
-            json.dump(leaderboard, f)
-        return True
-    except:
-        return False
+    """Lee la partida guardada con el mismo formato que usa el juego (ver core.load_game)."""
+    return core.load_game()
 
 def get_leaderboard():
+    """Top 10 del leaderboard (misma consulta que usa el juego, ver core.get_leaderboard)."""
+    return core.get_leaderboard(10)
+
+def get_leaderboard_cached():
+    """Devuelve el leaderboard sin releer el archivo en cada cuadro.
+
+    Como mucho cada LEADERBOARD_CHECK_MS se consulta si la base cambió (leaderboard.data_stamp,
+    que también ve las partidas de otras instancias); solo entonces se repite la consulta del top 10.
+    """
+    now = pygame.time.get_ticks()
+    checked_at = leaderboard_cache["checked_at"]
+    if checked_at is not None and now - checked_at < LEADERBOARD_CHECK_MS:
+        return leaderboard_cache["entries"]
+    leaderboard_cache["checked_at"] = now
     try:
-        if os.path.exists(LEADERBOARD_FILE):
-            with open(LEADERBOARD_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return []
+        stamp = data_stamp()
+    except Exception:
+        stamp = None
+    if stamp != leaderboard_cache["stamp"] or checked_at is None:
+        leaderboard_cache["stamp"] = stamp
+        leaderboard_cache["entries"] = get_leaderboard() if stamp else []
+    return leaderboard_cache["entries"]
 
 # Funciones de dibujo mejoradas
 def draw_crystal(surface, x, y, size, color1, color2):
@@ -185,7 +180,10 @@ def draw_torch_flame(surface, x, y, size, frame):
     pygame.draw.polygon(surface, (255, 200, 100), points)
     pygame.draw.polygon(surface, (255, 100, 50), points, 1)
 
-def draw_background(surface, frame_counter):
+def render_static_background():
+    """Dibuja una sola vez la parte fija del fondo: degradado, arco, cristales y suelo."""
+    surface = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+
     # Fondo degradado
     for y in range(SCREEN_H):
         color_factor = y / SCREEN_H
@@ -207,10 +205,6 @@ def draw_background(surface, frame_counter):
     draw_crystal(surface, 150, SCREEN_H - 150, 35, CRYSTAL_BLUE, (150, 220, 255))
     draw_crystal(surface, SCREEN_W - 150, SCREEN_H - 100, 40, CRYSTAL_PURPLE, (200, 150, 255))
     
-    # Antorchas animadas
-    draw_torch_flame(surface, 80, 300, 15, frame_counter)
-    draw_torch_flame(surface, SCREEN_W - 80, 350, 15, frame_counter)
-    
     # Suelo de la mazmorra
     pygame.draw.rect(surface, (30, 25, 40), 
                    (0, SCREEN_H - 100, SCREEN_W, 100))
@@ -219,6 +213,32 @@ def draw_background(surface, frame_counter):
     for i in range(0, SCREEN_W, 40):
         pygame.draw.rect(surface, (40, 35, 50), 
                        (i, SCREEN_H - 100, 30, 20))
+    return surface
+
+def torch_rect(x, y, size):
+    """Rectángulo que cubre la llama de una antorcha en cualquier cuadro de la animación."""
+    return pygame.Rect(x - size // 2 - 2, y - size - 4, size + 5, size + size // 3 + 7)
+
+def draw_torches(surface, frame_counter):
+    """Redibuja solo las llamas de las antorchas (fondo fijo + llama). Devuelve las zonas tocadas."""
+    rects = []
+    for x, y, size in TORCHES:
+        rect = torch_rect(x, y, size)
+        surface.blit(static_background, rect, rect)
+        draw_torch_flame(surface, x, y, size, frame_counter)
+        rects.append(rect)
+    return rects
+
+def draw_background(surface, frame_counter):
+    """Dibuja el fondo del menú: el fondo fijo (pre-renderado la primera vez) y las antorchas."""
+    global static_background
+    if static_background is None:
+        static_background = render_static_background()
+    surface.blit(static_background, (0, 0))
+    
+    # Antorchas animadas
+    for x, y, size in TORCHES:
+        draw_torch_flame(surface, x, y, size, frame_counter)
 
 def draw_title(surface):
     # Título con efecto neón
@@ -226,77 +246,91 @@ def draw_title(surface):
     subtitle_text = "MAZMORRAS OSCURAS"
     
     # Efecto de sombra
-    shadow = title_font.render(title_text, True, (20, 20, 40))
+    shadow = render_text(title_font, title_text, (20, 20, 40))
     shadow_rect = shadow.get_rect(center=(SCREEN_W // 2 + 3, 103))
     surface.blit(shadow, shadow_rect)
     
     # Texto principal con brillo
-    title = title_font.render(title_text, True, CRYSTAL_BLUE)
+    title = render_text(title_font, title_text, CRYSTAL_BLUE)
     title_rect = title.get_rect(center=(SCREEN_W // 2, 100))
     surface.blit(title, title_rect)
     
     # Subtítulo
-    subtitle = small_font.render(subtitle_text, True, SILVER)
+    subtitle = render_text(small_font, subtitle_text, SILVER)
     subtitle_rect = subtitle.get_rect(center=(SCREEN_W // 2, 140))
     surface.blit(subtitle, subtitle_rect)
 
-def draw_leaderboard(surface, leaderboard_data):
-    # Fondo semitransparente
-    overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
-    
-    # Panel del leaderboard
+def render_leaderboard_panel(leaderboard_data):
+    """Dibuja el panel del leaderboard (con la tabla) en una franja transparente del ancho de la pantalla.
+
+    La franja tiene el alto del panel; las esquinas redondeadas y los costados quedan transparentes.
+    """
     panel_width = 600
     panel_height = 500
     panel_x = (SCREEN_W - panel_width) // 2
-    panel_y = (SCREEN_H - panel_height) // 2
+    surface = pygame.Surface((SCREEN_W, panel_height), pygame.SRCALPHA)
     
     pygame.draw.rect(surface, (30, 35, 50), 
-                   (panel_x, panel_y, panel_width, panel_height), 
+                   (panel_x, 0, panel_width, panel_height), 
                    border_radius=15)
     pygame.draw.rect(surface, CRYSTAL_BLUE, 
-                   (panel_x, panel_y, panel_width, panel_height), 
+                   (panel_x, 0, panel_width, panel_height), 
                    3, border_radius=15)
     
     # Título
-    title = title_font.render("LEADERBOARD", True, GOLD)
-    surface.blit(title, (SCREEN_W // 2 - title.get_width() // 2, panel_y + 30))
+    title = render_text(title_font, "LEADERBOARD", GOLD)
+    surface.blit(title, (SCREEN_W // 2 - title.get_width() // 2, 30))
     
     # Encabezados
     headers = ["POS", "NICKNAME", "PUNTAJE", "PISO", "ENEMIGOS"]
     header_x = panel_x + 50
     for i, header in enumerate(headers):
-        text = small_font.render(header, True, CRYSTAL_PURPLE)
-        surface.blit(text, (header_x + i * 120, panel_y + 80))
+        text = render_text(small_font, header, CRYSTAL_PURPLE)
+        surface.blit(text, (header_x + i * 120, 80))
     
     # Datos
     for i, entry in enumerate(leaderboard_data[:10]):  # Top 10
-        y_pos = panel_y + 110 + i * 35
+        y_pos = 110 + i * 35
         
         # Posición
-        pos_text = small_font.render(f"{i+1}.", True, SILVER)
+        pos_text = render_text(small_font, f"{i+1}.", SILVER)
         surface.blit(pos_text, (header_x, y_pos))
         
         # Nickname
-        name_text = small_font.render(entry['nickname'][:12], True, SILVER)
+        name_text = render_text(small_font, entry['nickname'][:12], SILVER)
         surface.blit(name_text, (header_x + 120, y_pos))
         
         # Puntaje
-        score_text = small_font.render(str(entry['score']), True, GOLD)
+        score_text = render_text(small_font, str(entry['score']), GOLD)
         surface.blit(score_text, (header_x + 240, y_pos))
         
         # Piso alcanzado
-        level_text = small_font.render(str(entry['level_reached']), True, GREEN)
+        level_text = render_text(small_font, str(entry['level_reached']), GREEN)
         surface.blit(level_text, (header_x + 360, y_pos))
         
         # Enemigos eliminados
-        kills_text = small_font.render(str(entry['enemies_killed']), True, RED)
+        kills_text = render_text(small_font, str(entry['enemies_killed']), RED)
         surface.blit(kills_text, (header_x + 480, y_pos))
     
     # Instrucción para volver
-    back_text = small_font.render("Presiona ESC o click para volver", True, SILVER)
-    surface.blit(back_text, (SCREEN_W // 2 - back_text.get_width() // 2, panel_y + panel_height - 30))
+    back_text = render_text(small_font, "Presiona ESC o click para volver", SILVER)
+    surface.blit(back_text, (SCREEN_W // 2 - back_text.get_width() // 2, panel_height - 30))
+    return surface
+
+def draw_leaderboard(surface, leaderboard_data):
+    """Dibuja el leaderboard; el panel se vuelve a armar solo si cambiaron los datos."""
+    global leaderboard_panel, leaderboard_panel_data, leaderboard_overlay
+    # Fondo semitransparente
+    if leaderboard_overlay is None:
+        leaderboard_overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
+        leaderboard_overlay.fill((0, 0, 0, 200))
+    surface.blit(leaderboard_overlay, (0, 0))
+    
+    # Panel del leaderboard
+    if leaderboard_panel is None or leaderboard_panel_data != leaderboard_data:
+        leaderboard_panel = render_leaderboard_panel(leaderboard_data)
+        leaderboard_panel_data = list(leaderboard_data)
+    surface.blit(leaderboard_panel, (0, (SCREEN_H - leaderboard_panel.get_height()) // 2))
 
 def show_nickname_input(surface):
     overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
@@ -317,11 +351,11 @@ def show_nickname_input(surface):
                    3, border_radius=15)
     
     # Título
-    title = button_font.render("INGRESA TU NICKNAME", True, GOLD)
+    title = render_text(button_font, "INGRESA TU NICKNAME", GOLD)
     surface.blit(title, (SCREEN_W // 2 - title.get_width() // 2, panel_y + 30))
     
     # Instrucción
-    instr = small_font.render("(Máximo 15 caracteres, presiona ENTER para confirmar)", True, SILVER)
+    instr = render_text(small_font, "(Máximo 15 caracteres, presiona ENTER para confirmar)", SILVER)
     surface.blit(instr, (SCREEN_W // 2 - instr.get_width() // 2, panel_y + 70))
     
     # Caja de entrada
@@ -355,6 +389,8 @@ def main_menu():
     nickname = ""
     input_box = None
     
+    last_view = None  # Lo que se dibujó en el último cuadro completo
+    
     running = True
     while running:
         frame_counter += 1
@@ -403,6 +439,17 @@ def main_menu():
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     current_state = "main"
         
+        # Si nada cambió solo se animan las antorchas (el resto de la pantalla ya está dibujado)
+        leaderboard_data = get_leaderboard_cached() if current_state == "leaderboard" else None
+        view = (current_state, tuple(b['is_hovered'] for b in buttons),
+                (input_box['text'], input_box['active']) if input_box else None, leaderboard_data)
+        if view == last_view:
+            if current_state != "leaderboard":  # En el leaderboard el panel tapa las antorchas
+                pygame.display.update(draw_torches(screen, frame_counter))
+            clock.tick(60)
+            continue
+        last_view = view
+        
         # Dibujar todo según el estado actual
         draw_background(screen, frame_counter)
         draw_title(screen)
@@ -410,9 +457,10 @@ def main_menu():
         if current_state == "main":
             # Dibujar información de partida guardada si existe
             if saved_game:
-                save_info = small_font.render(
+                save_info = render_text(
+                    small_font,
                     f"Partida guardada: Piso {saved_game['level_reached']} - {saved_game['enemies_killed']} enemigos", 
-                    True, GREEN
+                    GREEN
                 )
                 screen.blit(save_info, (button_x + 20, start_y + 70 + 60))
             
@@ -424,7 +472,6 @@ def main_menu():
             draw_inputbox(input_box, screen)
             
         elif current_state == "leaderboard":
-            leaderboard_data = get_leaderboard()
             draw_leaderboard(screen, leaderboard_data)
         
         pygame.display.flip()
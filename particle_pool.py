@@ -0,0 +1,89 @@
+# particle_pool.py
+# Partículas como "estructura de arreglos" (sin clases): un diccionario con un arreglo NumPy
+# por campo (posición, velocidad, vida, tamaño, color) y capacidad fija.
+# Las partículas vivas ocupan siempre los índices [0, n); al morir se rellenan los huecos
+# con las últimas vivas (swap-remove), así no hay listas que crecen ni remove() O(n).
+
+import numpy as np
+
+PARTICLE_CAPACITY = 4096
+PARTICLE_GRAVITY = 0.02
+
+
+def make_pool(capacity=PARTICLE_CAPACITY, seed=None):
+    """Crea un pool vacío de 'capacity' partículas."""
+    return {
+        "n": 0,
+        "cap": capacity,
+        "x": np.zeros(capacity), "y": np.zeros(capacity),
+        "px": np.zeros(capacity), "py": np.zeros(capacity),   # Posición del paso anterior
+        "dx": np.zeros(capacity), "dy": np.zeros(capacity),
+        "life": np.zeros(capacity, dtype=np.int32),
+        "size": np.zeros(capacity, dtype=np.int32),
+        "color": np.zeros(capacity, dtype=np.int32),   # Índice en 'palette'
+        "palette": [],                                  # Colores (r, g, b) usados
+        "rng": np.random.default_rng(seed),
+    }
+
+def seed_pool(pool, seed):
+    """Reinicia el generador de números al azar del pool con 'seed' (efectos reproducibles)."""
+    pool["rng"] = np.random.default_rng(seed)
+
+def color_index(pool, color):
+    """Devuelve el índice de 'color' en la paleta del pool (agregándolo si es nuevo)."""
+    color = tuple(color)
+    palette = pool["palette"]
+    if color not in palette:
+        palette.append(color)
+    return palette.index(color)
+
+def spawn_burst(pool, x, y, n=6, color=(255,200,100), size=3, speed=1.2, life=18):
+    """Agrega n partículas alrededor de (x, y) con dirección al azar. Si el pool está lleno, sobran."""
+    start = pool["n"]
+    n = min(n, pool["cap"] - start)
+    if n <= 0:
+        return 0
+    rng = pool["rng"]
+    end = start + n
+    ang = rng.random(n) * np.pi * 2
+    pool["x"][start:end] = x + rng.uniform(-6, 6, n)
+    pool["y"][start:end] = y + rng.uniform(-6, 6, n)
+    pool["px"][start:end] = pool["x"][start:end]
+    pool["py"][start:end] = pool["y"][start:end]
+    pool["dx"][start:end] = np.cos(ang) * rng.uniform(0.2, speed, n)
+    pool["dy"][start:end] = np.sin(ang) * rng.uniform(0.2, speed, n)
+    pool["life"][start:end] = rng.integers(int(life * 0.6), int(life * 1.2) + 1, n)
+    pool["size"][start:end] = rng.integers(1, size + 1, n)
+    pool["color"][start:end] = color_index(pool, color)
+    pool["n"] = end
+    return n
+
+def update_pool(pool):
+    """Avanza un paso todas las partículas vivas y quita las que se apagaron (swap-remove).
+
+    Antes de mover guarda la posición en px/py para poder interpolar al dibujar.
+    """
+    n = pool["n"]
+    if n == 0:
+        return
+    x = pool["x"]; y = pool["y"]; dx = pool["dx"]; dy = pool["dy"]; life = pool["life"]
+    pool["px"][:n] = x[:n]
+    pool["py"][:n] = y[:n]
+    x[:n] += dx[:n]
+    y[:n] += dy[:n]
+    life[:n] -= 1
+    dy[:n] += PARTICLE_GRAVITY
+    alive = life[:n] > 0
+    k = int(np.count_nonzero(alive))
+    if k < n:
+        # Los huecos dentro de [0, k) se llenan con las vivas que quedaron en [k, n)
+        holes = np.flatnonzero(~alive[:k])
+        movers = np.flatnonzero(alive[k:]) + k
+        for name in ("x", "y", "px", "py", "dx", "dy", "life", "size", "color"):
+            arr = pool[name]
+            arr[holes] = arr[movers]
+        pool["n"] = k
+
+def clear_pool(pool):
+    """Elimina todas las partículas."""
+    pool["n"] = 0
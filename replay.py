@@ -0,0 +1,164 @@
+# replay.py
+# Grabación y reproducción de partidas (sin clases).
+#
+# Una partida nueva queda determinada por su semilla y la lista de acciones que se le dieron a
+# core.step, así que eso es todo lo que se graba. El archivo es una cabecera con la semilla
+# seguida de un cuadro de 9 bytes por acción: número de turno, código de la acción y el
+# state_hash del estado sobre el que se aplicó. Al reproducir se compara el hash antes de cada
+# acción, de modo que una divergencia se detecta en el turno exacto en que aparece.
+#
+# Cada cuadro se escribe al momento (sin fsync): si el juego se cierra de golpe, lo grabado
+# hasta ese turno sigue sirviendo. Un cuadro cortado al final se ignora.
+#
+# Uso sin ventana:  python replay.py partida.rpl
+
+import os
+import struct
+import sys
+import time
+
+import core
+
+REPLAY_MAGIC = b"RGRP"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sBBQ")   # Magia, versión, opciones, semilla de la partida
+REPLAY_FRAME = struct.Struct("<IBI")      # Turno, acción, hash del estado antes de la acción
+FLAG_ENDLESS = 1
+
+# El código de cada acción es su posición: solo se agregan al final para no romper grabaciones viejas
+ACTIONS = ("up", "down", "left", "right", "shop", "potion", "arrow", "strike", "next_level",
+           "attack", "defend", "flee", "buy1", "buy2", "buy3", "leave_shop")
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+END_CODE = 255                            # Último cuadro: hash del estado al dejar de grabar
+
+
+# ----------------------
+# GRABACIÓN
+# ----------------------
+
+def start_recording(path):
+    """Empieza a grabar la partida que se acaba de crear con core.new_game. Devuelve el grabador."""
+    f = open(path, "wb")
+    flags = FLAG_ENDLESS if core.endless_mode else 0
+    f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, flags, core.run_seed))
+    f.flush()
+    return {"file": f, "path": path, "turn": 0}
+
+def record_action(rec, action):
+    """Graba 'action' justo antes de pasársela a core.step (con el hash del estado actual)."""
+    rec["file"].write(REPLAY_FRAME.pack(rec["turn"], ACTION_CODES[action], core.state_hash()))
+    rec["file"].flush()
+    rec["turn"] += 1
+
+def stop_recording(rec):
+    """Cierra la grabación con el hash del estado final."""
+    if rec["file"].closed:
+        return
+    rec["file"].write(REPLAY_FRAME.pack(rec["turn"], END_CODE, core.state_hash()))
+    rec["file"].close()
+    print(f"Replay: {rec['turn']} turnos grabados en {rec['path']}")
+
+
+# ----------------------
+# LECTURA
+# ----------------------
+
+def load_replay(path):
+    """Lee una grabación: {"seed", "endless", "frames": [(turno, acción, hash)], "final_hash"}.
+
+    "final_hash" es None si la grabación no se cerró (el juego se cortó antes).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < REPLAY_HEADER.size:
+        raise ValueError(f"{path}: no es una grabación")
+    magic, version, flags, seed = REPLAY_HEADER.unpack_from(data, 0)
+    if magic != REPLAY_MAGIC:
+        raise ValueError(f"{path}: no es una grabación")
+    if version != REPLAY_VERSION:
+        raise ValueError(f"{path}: versión de grabación {version} no soportada")
+    frames = []
+    final_hash = None
+    end = len(data) - (len(data) - REPLAY_HEADER.size) % REPLAY_FRAME.size  # Sin el cuadro cortado
+    for turn, code, expected in REPLAY_FRAME.iter_unpack(data[REPLAY_HEADER.size:end]):
+        if code == END_CODE:
+            final_hash = expected
+            break
+        if code >= len(ACTIONS) or turn != len(frames):
+            raise ValueError(f"{path}: cuadro inválido en el turno {len(frames)}")
+        frames.append((turn, ACTIONS[code], expected))
+    return {"seed": seed, "endless": bool(flags & FLAG_ENDLESS), "frames": frames, "final_hash": final_hash}
+
+
+# ----------------------
+# REPRODUCCIÓN
+# ----------------------
+
+def start_playback(replay):
+    """Crea la partida de la grabación (sin nickname: no toca guardados ni leaderboard)."""
+    core.new_game("", replay["endless"], seed=replay["seed"])
+    return {"replay": replay, "pos": 0, "diverged": None}
+
+def resolve_enemy_turn():
+    """Ejecuta el turno del enemigo que quedó pendiente (en el juego llega un momento después)."""
+    if core.game_state == "combate" and core.combat_turn == "enemy":
+        core.enemy_turn()
+
+def play_next(play):
+    """Aplica la siguiente acción grabada. Devuelve False al terminar o al detectar una divergencia."""
+    frames = play["replay"]["frames"]
+    if play["diverged"] is not None:
+        return False
+    if play["pos"] >= len(frames):
+        # La grabación pudo cerrarse con el turno del enemigo todavía pendiente
+        expected = play["replay"]["final_hash"]
+        if expected is not None and core.state_hash() != expected:
+            resolve_enemy_turn()
+            if core.state_hash() != expected:
+                report_divergence(play, play["pos"], expected)
+        return False
+    resolve_enemy_turn()
+    turn, action, expected = frames[play["pos"]]
+    if core.state_hash() != expected:
+        report_divergence(play, turn, expected)
+        return False
+    core.step(action, auto_enemy_turn=False)
+    play["pos"] += 1
+    return True
+
+def report_divergence(play, turn, expected):
+    """Anota y avisa en qué turno el estado dejó de coincidir con el grabado."""
+    play["diverged"] = turn
+    print(f"Replay: divergencia en el turno {turn} (esperado {expected:08x}, obtenido {core.state_hash():08x})")
+
+def play_headless(path):
+    """Reproduce una grabación completa sin ventana ni efectos. Devuelve el resumen de la corrida."""
+    replay = load_replay(path)
+    effects = core.effects_enabled
+    core.effects_enabled = False
+    try:
+        t0 = time.perf_counter()
+        play = start_playback(replay)
+        while play_next(play):
+            pass
+        seconds = time.perf_counter() - t0
+    finally:
+        core.effects_enabled = effects
+    return {"turns": play["pos"], "total_turns": len(replay["frames"]), "diverged": play["diverged"],
+            "seconds": seconds, "level": core.level_number, "game_state": core.game_state}
+
+def print_summary(res):
+    """Imprime el resultado de play_headless."""
+    status = "OK" if res["diverged"] is None else f"DIVERGE en el turno {res['diverged']}"
+    print(f"Turnos: {res['turns']}/{res['total_turns']} | Piso: {res['level']} | Estado: {res['game_state']} | {status}")
+    if res["seconds"] > 0:
+        print(f"Tiempo: {res['seconds']:.3f} s ({res['turns'] / res['seconds']:.0f} turnos/s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("Uso: python replay.py partida.rpl")
+        sys.exit(2)
+    res = play_headless(sys.argv[1])
+    print_summary(res)
+    sys.exit(0 if res["diverged"] is None else 1)
@@ -0,0 +1,30 @@
+# rng.py
+# Números al azar reproducibles (sin clases): una semilla por partida y, derivados de ella,
+# generadores independientes por subsistema. Así lo cosmético (partículas, textos) no cambia
+# el resultado de un combate, y un piso depende solo de (semilla, subsistema, número de piso).
+#
+# Cada generador es un random.Random propio; derive_seed usa SHA-256 para que semillas
+# vecinas den secuencias sin relación entre sí.
+
+import hashlib
+import random
+
+STREAMS = ("mapgen", "spawns", "ai", "combat", "cosmetics")
+
+
+def new_run_seed():
+    """Semilla nueva para una partida (sale del módulo random, así random.seed la fija en pruebas)."""
+    return random.getrandbits(63)
+
+def derive_seed(run_seed, *parts):
+    """Semilla de 63 bits derivada de la de la partida y de 'parts' (nombre del subsistema, piso...)."""
+    key = ":".join(str(p) for p in (run_seed,) + parts).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "little") >> 1
+
+def make_stream(run_seed, *parts):
+    """Generador random.Random independiente para (run_seed, *parts)."""
+    return random.Random(derive_seed(run_seed, *parts))
+
+def make_streams(run_seed, *parts):
+    """Un generador por cada subsistema de STREAMS: {"mapgen": Random, "spawns": Random, ...}."""
+    return {name: make_stream(run_seed, name, *parts) for name in STREAMS}
@@ -0,0 +1,296 @@
+# savefile.py
+# Formato binario versionado de la partida guardada (sin clases).
+#
+# Estructura (little-endian):
+#   cabecera fija (HEADER) con la versión, tamaño del mapa, contadores, posiciones, el
+#   identificador del checkpoint (lo usa el diario, ver más abajo) y la semilla de la partida
+#   nickname y archivo del mapa por bloques (UTF-8, largo en la cabecera)
+#   tabla de nombres de tipos de enemigo (1 byte de largo + UTF-8 cada uno)
+#   bloque de datos comprimido con zlib (paredes y niebla se repiten mucho):
+#     jugador (PLAYER, enteros de ancho fijo)
+#     casillas del mapa: 1 byte por casilla, igual que grid["cells"] (no está si el mapa es por bloques)
+#     niebla ('explored'): 1 bit por casilla (numpy.packbits)
+#     tabla de enemigos: ENEMY bytes por enemigo, el tipo como índice en la tabla de nombres
+#   CRC32 de todo lo anterior
+#
+# encode_save recibe una foto con valores simples (core.snapshot_game) y decode_save devuelve
+# los bloques listos para usar: bytearrays para las grillas y diccionarios para las entidades.
+#
+# DIARIO (journal): entre checkpoints, cada guardado agrega al final de otro archivo solo lo
+# que cambió desde el anterior (estadísticas, casillas, bytes de niebla, enemigos). Empieza
+# con el identificador del checkpoint al que corresponde: si no coincide (se cortó la luz
+# entre escribir un checkpoint nuevo y vaciar el diario) se ignora entero. Cada tanda va en un
+# marco con largo y CRC32; una tanda cortada a la mitad se descarta al leer.
+
+import struct
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+SAVE_MAGIC = b"RGSV"
+SAVE_VERSION = 3
+SAVE_COMPRESSION = 6   # Nivel de zlib del bloque de datos
+
+FLAG_CHUNKED = 1   # El mapa vive en un archivo por bloques (chunks.py); no se guardan las casillas
+FLAG_SHOP = 2      # Hay tienda en este piso
+
+# magic, versión, flags, w, h, piso, enemigos muertos, puntaje, salida x/y, tienda x/y,
+# cantidad de enemigos, fecha (segundos epoch), largo nickname, largo archivo de mapa,
+# cantidad de tipos, (desde la versión 2) identificador del checkpoint y (desde la 3) semilla
+HEADERS = {1: struct.Struct("<4sHHIIIIiiiiiIdHHH"), 2: struct.Struct("<4sHHIIIIiiiiiIdHHHI"),
+           3: struct.Struct("<4sHHIIIIiiiiiIdHHHIQ")}
+PLAYER_FIELDS = ("hp", "hp_max", "atk", "def", "gold", "potions", "attack_buff", "level", "exp",
+                 "exp_to_next_level", "cd_strike", "cd_arrow", "x", "y")
+PLAYER = struct.Struct("<" + "i" * len(PLAYER_FIELDS))
+# (uid desde la versión 2), x, y, hp, hp_max, atk, def, nivel, oro, tipo,
+# flags (bit 0 = activo), aturdido, patrulla
+ENEMIES = {1: struct.Struct("<iiiiiiiiBBBB"), 2: struct.Struct("<IiiiiiiiiBBBB")}
+ENEMIES[3] = ENEMIES[2]
+HEADER = HEADERS[SAVE_VERSION]
+ENEMY = ENEMIES[SAVE_VERSION]
+PATROL_DIRS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+CRC = struct.Struct("<I")
+
+JOURNAL_MAGIC = b"RGJL"
+JOURNAL_HEADER = struct.Struct("<4sHI")   # magic, versión, identificador del checkpoint
+FRAME = struct.Struct("<II")              # largo y CRC32 de la tanda
+# Operaciones del diario (1 byte de código + datos)
+OP_STATS = 1          # STATS + PLAYER completos
+OP_TILE = 2           # índice de casilla + tipo
+OP_FOG = 3            # índice de byte de la niebla empaquetada + valor
+OP_ENEMY = 4          # largo del nombre del tipo + nombre + ENEMY (alta o cambio)
+OP_ENEMY_REMOVE = 5   # uid
+# enemigos muertos, puntaje, salida x/y, tienda x/y (-1 si no hay)
+STATS = struct.Struct("<Iiiiii")
+TILE_OP = struct.Struct("<IB")
+FOG_OP = struct.Struct("<IB")
+UID = struct.Struct("<I")
+
+
+# ----------------------
+# CODIFICACIÓN
+# ----------------------
+
+def pack_enemy(e, type_index):
+    """Empaqueta un enemigo de la foto en un registro ENEMY (tipo como índice)."""
+    return ENEMY.pack(e["uid"], e["x"], e["y"], e["hp"], e["hp_max"], e["atk"], e["def"], e["level"],
+                      e["gold_drop"], type_index, 1 if e["active"] else 0, min(255, e["stun"]),
+                      PATROL_DIRS.index(tuple(e["patrol_dir"])))
+
+def pack_fog(explored):
+    """Niebla de 0/1 (un byte por casilla) a 1 bit por casilla."""
+    return np.packbits(np.frombuffer(explored, dtype=np.uint8) != 0).tobytes()
+
+def encode_save(snap, checkpoint_id=0):
+    """Convierte una foto de la partida en los bytes del archivo de guardado."""
+    w, h = snap["map_size"]
+    nick = snap["player_nickname"].encode("utf-8")
+    map_file = (snap["map_file"] or "").encode("utf-8")
+    types = []
+    type_index = {}
+    for e in snap["enemies"]:
+        if e["type"] not in type_index:
+            type_index[e["type"]] = len(types)
+            types.append(e["type"].encode("utf-8"))
+    flags = (FLAG_CHUNKED if snap["map_cells"] is None else 0) | (FLAG_SHOP if snap["shop_pos"] else 0)
+    shop_x, shop_y = snap["shop_pos"] or (-1, -1)
+    parts = [
+        HEADER.pack(SAVE_MAGIC, SAVE_VERSION, flags, w, h, snap["level_reached"], snap["enemies_killed"],
+                    snap["total_score"], snap["exit_pos"][0], snap["exit_pos"][1], shop_x, shop_y,
+                    len(snap["enemies"]), snap["timestamp"], len(nick), len(map_file), len(types),
+                    checkpoint_id, snap["run_seed"]),
+        nick, map_file,
+    ]
+    for name in types:
+        parts.append(bytes([len(name)]) + name)
+    p = snap["player"]
+    payload = [PLAYER.pack(*(p[k] for k in PLAYER_FIELDS))]
+    if snap["map_cells"] is not None:
+        payload.append(snap["map_cells"])
+    payload.append(pack_fog(snap["explored"]))
+    payload.append(b"".join(pack_enemy(e, type_index[e["type"]]) for e in snap["enemies"]))
+    parts.append(zlib.compress(b"".join(payload), SAVE_COMPRESSION))
+    body = b"".join(parts)
+    return body + CRC.pack(zlib.crc32(body))
+
+
+# ----------------------
+# DECODIFICACIÓN
+# ----------------------
+
+def is_binary_save(data):
+    """Indica si 'data' empieza como una partida binaria."""
+    return data[:4] == SAVE_MAGIC
+
+def decode_save(data):
+    """Lee los bytes de un guardado binario. Lanza ValueError si no son válidos.
+
+    Devuelve un diccionario con las mismas claves de resumen que el guardado JSON
+    (player, enemies, exit_pos, shop_pos, level_reached...) más 'map_size', 'tiles'
+    (bytearray o None si el mapa es por bloques), 'explored' (bytearray de 0/1),
+    'checkpoint_id' y 'run_seed' (None en guardados anteriores a la versión 3).
+    """
+    if len(data) < HEADERS[1].size + CRC.size or not is_binary_save(data):
+        raise ValueError("no es una partida binaria")
+    body = memoryview(data)[:-CRC.size]
+    if CRC.unpack_from(data, len(data) - CRC.size)[0] != zlib.crc32(body):
+        raise ValueError("partida dañada (CRC distinto)")
+    version = struct.unpack_from("<H", body, 4)[0]
+    if version not in HEADERS:
+        raise ValueError(f"versión {version} no soportada")
+    header = HEADERS[version].unpack_from(body, 0)
+    (_, _, flags, w, h, level_reached, enemies_killed, total_score, exit_x, exit_y,
+     shop_x, shop_y, n_enemies, stamp, nick_len, map_file_len, n_types) = header[:17]
+    checkpoint_id = header[17] if version >= 2 else 0
+    run_seed = header[18] if version >= 3 else None
+    pos = HEADERS[version].size
+    nick = bytes(body[pos:pos + nick_len]).decode("utf-8"); pos += nick_len
+    map_file = bytes(body[pos:pos + map_file_len]).decode("utf-8"); pos += map_file_len
+    types = []
+    for _ in range(n_types):
+        n = body[pos]
+        types.append(bytes(body[pos + 1:pos + 1 + n]).decode("utf-8")); pos += 1 + n
+    body = memoryview(zlib.decompress(body[pos:]))
+    pos = 0
+    player = dict(zip(PLAYER_FIELDS, PLAYER.unpack_from(body, pos))); pos += PLAYER.size
+    size = w * h
+    tiles = None
+    if not flags & FLAG_CHUNKED:
+        tiles = bytearray(body[pos:pos + size]); pos += size
+    fog_len = (size + 7) // 8
+    fog = np.unpackbits(np.frombuffer(body[pos:pos + fog_len], dtype=np.uint8), count=size)
+    explored = bytearray(fog.tobytes()); pos += fog_len
+    record = ENEMIES[version]
+    enemies = []
+    for i, fields in enumerate(struct.iter_unpack(record.format, body[pos:pos + record.size * n_enemies])):
+        if version < 2:
+            fields = (i + 1,) + fields   # Los guardados v1 no tenían uid
+        enemies.append(unpack_enemy(fields, types))
+    return {
+        "version": version,
+        "checkpoint_id": checkpoint_id,
+        "run_seed": run_seed,
+        "player": player,
+        "enemies": enemies,
+        "map_size": (w, h),
+        "tiles": tiles,
+        "explored": explored,
+        "map_file": map_file or None,
+        "exit_pos": (exit_x, exit_y),
+        "shop_pos": (shop_x, shop_y) if flags & FLAG_SHOP else None,
+        "enemies_killed": enemies_killed,
+        "total_score": total_score,
+        "level_reached": level_reached,
+        "player_nickname": nick,
+        "timestamp": datetime.fromtimestamp(stamp).isoformat(),
+    }
+
+def unpack_enemy(fields, types):
+    """Convierte los campos de un registro ENEMY en el diccionario de datos guardados del enemigo."""
+    uid, x, y, hp, hp_max, atk, dfn, level, gold, t, eflags, stun, patrol = fields
+    return {"uid": uid, "x": x, "y": y, "hp": hp, "hp_max": hp_max, "atk": atk, "def": dfn, "level": level,
+            "gold_drop": gold, "type": types[t], "active": bool(eflags & 1), "stun": stun,
+            "patrol_dir": PATROL_DIRS[patrol]}
+
+
+# ----------------------
+# DIARIO DE CAMBIOS
+# ----------------------
+
+def encode_journal_header(checkpoint_id):
+    """Comienzo de un diario vacío para el checkpoint 'checkpoint_id'."""
+    return JOURNAL_HEADER.pack(JOURNAL_MAGIC, SAVE_VERSION, checkpoint_id)
+
+def same_floor(base, snap):
+    """Indica si dos fotos son del mismo piso de la misma partida (si no, el diario no sirve)."""
+    return (base["player_nickname"] == snap["player_nickname"] and base["run_seed"] == snap["run_seed"]
+            and base["level_reached"] == snap["level_reached"]
+            and base["map_size"] == snap["map_size"] and base["map_file"] == snap["map_file"]
+            and (base["map_cells"] is None) == (snap["map_cells"] is None))
+
+def encode_delta(base, snap):
+    """Devuelve las operaciones del diario que llevan de la foto 'base' a 'snap' (b"" si no cambió nada)."""
+    ops = []
+    if (base["player"] != snap["player"] or base["enemies_killed"] != snap["enemies_killed"]
+            or base["total_score"] != snap["total_score"] or base["exit_pos"] != snap["exit_pos"]
+            or base["shop_pos"] != snap["shop_pos"]):
+        shop_x, shop_y = snap["shop_pos"] or (-1, -1)
+        p = snap["player"]
+        ops.append(bytes([OP_STATS]) + STATS.pack(snap["enemies_killed"], snap["total_score"],
+                                                  snap["exit_pos"][0], snap["exit_pos"][1], shop_x, shop_y)
+                   + PLAYER.pack(*(p[k] for k in PLAYER_FIELDS)))
+    if snap["map_cells"] is not None and base["map_cells"] != snap["map_cells"]:
+        new = np.frombuffer(snap["map_cells"], dtype=np.uint8)
+        for i in np.flatnonzero(np.frombuffer(base["map_cells"], dtype=np.uint8) != new):
+            ops.append(bytes([OP_TILE]) + TILE_OP.pack(int(i), int(new[i])))
+    if base["explored"] != snap["explored"]:
+        old_fog = np.frombuffer(pack_fog(base["explored"]), dtype=np.uint8)
+        new_fog = np.frombuffer(pack_fog(snap["explored"]), dtype=np.uint8)
+        for i in np.flatnonzero(old_fog != new_fog):
+            ops.append(bytes([OP_FOG]) + FOG_OP.pack(int(i), int(new_fog[i])))
+    old = {e["uid"]: e for e in base["enemies"]}
+    alive = set()
+    for e in snap["enemies"]:
+        alive.add(e["uid"])
+        if old.get(e["uid"]) != e:
+            name = e["type"].encode("utf-8")
+            ops.append(bytes([OP_ENEMY, len(name)]) + name + pack_enemy(e, 0))
+    for uid in old:
+        if uid not in alive:
+            ops.append(bytes([OP_ENEMY_REMOVE]) + UID.pack(uid))
+    return b"".join(ops)
+
+def encode_frame(payload):
+    """Envuelve una tanda de operaciones con su largo y CRC32 para agregarla al diario."""
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def apply_journal(saved, data):
+    """Aplica el diario 'data' sobre un guardado leído con decode_save (lo modifica en el lugar).
+
+    Devuelve cuántas tandas aplicó. Si el diario es de otro checkpoint no aplica nada; si la
+    última tanda está cortada o dañada, se detiene ahí.
+    """
+    if len(data) < JOURNAL_HEADER.size:
+        return 0
+    magic, _, checkpoint_id = JOURNAL_HEADER.unpack_from(data, 0)
+    if magic != JOURNAL_MAGIC or checkpoint_id != saved["checkpoint_id"]:
+        return 0
+    enemies = {e["uid"]: e for e in saved["enemies"]}
+    tiles = saved["tiles"]; explored = saved["explored"]; size = len(explored)
+    pos = JOURNAL_HEADER.size
+    frames = 0
+    while pos + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, pos)
+        payload = data[pos + FRAME.size:pos + FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        pos += FRAME.size + length
+        frames += 1
+        i = 0
+        while i < length:
+            op = payload[i]; i += 1
+            if op == OP_STATS:
+                killed, score, exit_x, exit_y, shop_x, shop_y = STATS.unpack_from(payload, i); i += STATS.size
+                saved["player"] = dict(zip(PLAYER_FIELDS, PLAYER.unpack_from(payload, i))); i += PLAYER.size
+                saved["enemies_killed"] = killed; saved["total_score"] = score
+                saved["exit_pos"] = (exit_x, exit_y)
+                saved["shop_pos"] = (shop_x, shop_y) if shop_x >= 0 else None
+            elif op == OP_TILE:
+                idx, tile = TILE_OP.unpack_from(payload, i); i += TILE_OP.size
+                tiles[idx] = tile
+            elif op == OP_FOG:
+                idx, value = FOG_OP.unpack_from(payload, i); i += FOG_OP.size
+                bits = np.unpackbits(np.array([value], dtype=np.uint8)).tobytes()
+                end = min(size, idx * 8 + 8)
+                explored[idx * 8:end] = bits[:end - idx * 8]
+            elif op == OP_ENEMY:
+                n = payload[i]; name = payload[i + 1:i + 1 + n].decode("utf-8"); i += 1 + n
+                e = unpack_enemy(ENEMY.unpack_from(payload, i), [name]); i += ENEMY.size
+                enemies[e["uid"]] = e
+            elif op == OP_ENEMY_REMOVE:
+                enemies.pop(UID.unpack_from(payload, i)[0], None); i += UID.size
+            else:
+                raise ValueError(f"operación de diario desconocida: {op}")
+    saved["enemies"] = list(enemies.values())
+    return frames
@@ -0,0 +1,62 @@
+# scheduler.py
+# Planificador de eventos con tiempo (sin clases): un diccionario con el reloj actual y un
+# montículo (heapq) de llamadas pendientes ordenadas por el momento en que vencen.
+# El reloj no lee la hora del sistema: avanza solo cuando el loop llama a advance(), así
+# la lógica sigue sin depender de pygame y una pausa no consume los tiempos pendientes.
+#
+# Cada evento puede tener una clave ("enemy_turn", "combat_log"...): volver a planificar con
+# la misma clave reemplaza al anterior, y cancel(clave) lo descarta.
+
+import heapq
+
+
+def make_scheduler():
+    """Crea un planificador vacío con el reloj en 0 ms."""
+    return {"now": 0.0, "queue": [], "keys": {}, "seq": 0}
+
+def schedule(sched, delay_ms, callback, key=None):
+    """Planifica callback() para dentro de delay_ms. Si 'key' ya estaba planificada, la reemplaza."""
+    if key is not None:
+        cancel(sched, key)
+    sched["seq"] += 1
+    # [vence, orden de llegada, función, clave, vigente]
+    entry = [sched["now"] + delay_ms, sched["seq"], callback, key, True]
+    heapq.heappush(sched["queue"], entry)
+    if key is not None:
+        sched["keys"][key] = entry
+    return entry
+
+def cancel(sched, key):
+    """Descarta el evento pendiente con esa clave (si hay). Devuelve True si había uno."""
+    entry = sched["keys"].pop(key, None)
+    if entry is None:
+        return False
+    entry[4] = False  # Se quita del montículo cuando llegue su turno
+    return True
+
+def is_pending(sched, key):
+    """Indica si hay un evento pendiente con esa clave."""
+    return key in sched["keys"]
+
+def advance(sched, elapsed_ms):
+    """Avanza el reloj y ejecuta, en orden, los eventos que vencieron. Devuelve cuántos ejecutó.
+
+    Los eventos que una función planifica con delay 0 se ejecutan en el mismo llamado.
+    """
+    sched["now"] += elapsed_ms
+    queue = sched["queue"]; keys = sched["keys"]
+    ran = 0
+    while queue and queue[0][0] <= sched["now"]:
+        entry = heapq.heappop(queue)
+        if not entry[4]:
+            continue
+        if entry[3] is not None:
+            keys.pop(entry[3], None)
+        entry[2]()
+        ran += 1
+    return ran
+
+def clear_scheduler(sched):
+    """Descarta todos los eventos pendientes (el reloj sigue donde estaba)."""
+    sched["queue"].clear()
+    sched["keys"].clear()
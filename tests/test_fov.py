@@ -0,0 +1,38 @@
+# compute_fov (shadowcasting): simetría entre casillas de suelo y radios grandes sin recursión.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core    # noqa: E402
+from chunks import open_chunked_map, close_chunked_map, ensure_area, chunk_room  # noqa: E402
+from grid import WALKABLE  # noqa: E402
+
+
+def test_fov_is_symmetric_on_generated_floors():
+    for seed, level in ((1, 1), (2, 4), (3, 9)):
+        floor_map = core.generate_floor(seed, level)["map"]
+        w = floor_map["w"]; h = floor_map["h"]; tiles = floor_map["cells"]
+        open_cells = [(x, y) for y in range(h) for x in range(w) if WALKABLE[tiles[y * w + x]]]
+        seen = {(x, y): set(core.compute_fov(x, y, core.VISION_RADIUS, floor_map)) for x, y in open_cells}
+        for (ax, ay), cells in seen.items():
+            for bx, by in open_cells:
+                a_sees_b = by * w + bx in cells
+                b_sees_a = ay * w + ax in seen[(bx, by)]
+                assert a_sees_b == b_sees_a, (seed, level, (ax, ay), (bx, by))
+
+
+def test_fov_large_radius_on_endless_map(tmp_path):
+    store = open_chunked_map(str(tmp_path / "endless_map.bin"), core.ENDLESS_MAP_SIZE, core.ENDLESS_MAP_SIZE, seed=7)
+    try:
+        cx, cy = store["chunks_x"] // 2, store["chunks_y"] // 2
+        room = chunk_room(store, cx, cy)
+        px, py = (room[0] + room[2]) // 2, (room[1] + room[3]) // 2
+        ensure_area(store, px, py, 400)
+        cells = core.compute_fov(px, py, 1500, store)
+        assert py * store["w"] + px in cells
+        assert len(cells) > 1
+    finally:
+        close_chunked_map(store)
@@ -0,0 +1,60 @@
+# leaderboard.py: orden del top, posición de un puntaje y data_stamp (del que depende la caché del menú).
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core         # noqa: E402
+import leaderboard  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base de leaderboard nueva en un directorio temporal."""
+    monkeypatch.chdir(tmp_path)
+    leaderboard.close_connection()
+    yield tmp_path / leaderboard.LEADERBOARD_DB
+    leaderboard.close_connection()
+
+
+def test_top_scores_and_rank(db):
+    for nick, score in (("ana", 300), ("beto", 900), ("ana", 500), ("caro", 100), ("dani", 500)):
+        leaderboard.add_entry(nick, score, level_reached=3, enemies_killed=4)
+
+    top = core.get_leaderboard(10)
+    assert [(e["nickname"], e["score"]) for e in top] == [
+        ("beto", 900), ("ana", 500), ("dani", 500), ("ana", 300), ("caro", 100)]   # Empates: el más antiguo primero
+    assert [e["score"] for e in core.get_leaderboard(2)] == [900, 500]
+    assert set(top[0]) == {"nickname", "score", "level_reached", "enemies_killed", "timestamp"}
+
+    assert leaderboard.rank_of_score(1000) == 1
+    assert leaderboard.rank_of_score(900) == 1
+    assert leaderboard.rank_of_score(500) == 2
+    assert leaderboard.rank_of_score(400) == 4
+    assert leaderboard.rank_of_score(0) == 6
+    assert leaderboard.add_entry("eli", 600, 2, 1) == 2
+    assert leaderboard.best_for("ana")["score"] == 500
+    assert leaderboard.best_for("nadie") is None
+    assert leaderboard.count_runs() == 6
+
+
+def test_data_stamp_changes_after_insert(db):
+    stamp = leaderboard.data_stamp()
+    assert leaderboard.data_stamp() == stamp
+    leaderboard.add_entry("ana", 10, 1, 0)
+    after_local = leaderboard.data_stamp()
+    assert after_local != stamp
+
+    # Otra instancia del juego escribe en la misma base
+    other = sqlite3.connect(str(db))
+    other.execute("INSERT INTO runs (nickname, score, level_reached, enemies_killed, timestamp) "
+                  "VALUES ('beto', 20, 1, 0, '2026-01-01T00:00:00')")
+    other.commit()
+    other.close()
+    assert leaderboard.data_stamp() != after_local
+    assert [e["score"] for e in leaderboard.top_scores(5)] == [20, 10]
@@ -0,0 +1,41 @@
+# particle_pool.update_pool: las partículas que mueren se reemplazan con las últimas vivas (swap-remove).
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from particle_pool import make_pool, spawn_burst, update_pool, PARTICLE_GRAVITY  # noqa: E402
+
+
+def test_update_pool_removes_first_middle_and_last():
+    pool = make_pool(capacity=16, seed=1)
+    assert spawn_burst(pool, 0, 0, n=7) == 7
+    n = pool["n"]
+    for i in range(n):
+        pool["x"][i] = 10.0 * i; pool["y"][i] = -float(i)
+        pool["dx"][i] = 1.0; pool["dy"][i] = 0.5
+        pool["size"][i] = i + 1
+        pool["life"][i] = 1 if i in (0, 3, n - 1) else 10 + i
+    update_pool(pool)
+
+    assert pool["n"] == 4
+    k = pool["n"]
+    survivors = sorted(zip(pool["x"][:k], pool["y"][:k], pool["px"][:k], pool["dy"][:k],
+                           pool["life"][:k], pool["size"][:k]))
+    expected = sorted((10.0 * i + 1.0, -float(i) + 0.5, 10.0 * i, 0.5 + PARTICLE_GRAVITY, 9 + i, i + 1)
+                      for i in (1, 2, 4, 5))
+    assert [tuple(float(v) for v in s) for s in survivors] == [tuple(float(v) for v in e) for e in expected]
+    assert all(life > 0 for life in pool["life"][:k])
+
+
+def test_update_pool_all_dead_and_none_dead():
+    pool = make_pool(capacity=8, seed=2)
+    spawn_burst(pool, 0, 0, n=5)
+    pool["life"][:5] = 100
+    update_pool(pool)
+    assert pool["n"] == 5
+    pool["life"][:5] = 1
+    update_pool(pool)
+    assert pool["n"] == 0
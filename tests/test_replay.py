@@ -0,0 +1,53 @@
+# Grabaciones de replay.py: dos partidas seguidas en la misma sesión deben poder
+# reproducirse cada una en un proceso nuevo (sin arrastrar estado de la anterior).
+
+import os
+import random
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core    # noqa: E402
+import replay  # noqa: E402
+
+ACTIONS = ["up", "down", "left", "right"] * 4 + ["attack", "strike", "arrow", "next_level"]
+
+
+def record_game(path, seed, rng, max_turns=20000):
+    """Graba una partida nueva con acciones al azar hasta perderla (o hasta max_turns)."""
+    core.new_game("", seed=seed)
+    rec = replay.start_recording(path)
+    for _ in range(max_turns):
+        if core.game_state == "gameover":
+            break
+        action = "attack" if core.game_state == "combate" else rng.choice(ACTIONS)
+        if core.game_state == "shop":
+            action = "leave_shop"
+        replay.record_action(rec, action)
+        core.step(action)
+    replay.stop_recording(rec)
+    return core.game_state
+
+
+def replay_in_new_process(path):
+    return subprocess.run([sys.executable, os.path.join(ROOT, "replay.py"), path],
+                          cwd=os.path.dirname(path), capture_output=True, text=True)
+
+
+def test_two_games_in_one_session_replay(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(core, "effects_enabled", False)
+    rng = random.Random(5)
+    first = str(tmp_path / "primera.rpl")
+    second = str(tmp_path / "segunda.rpl")
+
+    # La primera termina en derrota: el combate queda en el turno del enemigo
+    assert record_game(first, seed=11, rng=rng) == "gameover"
+    record_game(second, seed=12, rng=rng, max_turns=300)
+
+    for path in (first, second):
+        res = replay_in_new_process(path)
+        assert res.returncode == 0, res.stdout
+        assert "DIVERGE" not in res.stdout
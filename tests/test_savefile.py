@@ -0,0 +1,134 @@
+# savefile.py: guardado binario (encode_save/decode_save) y diario de cambios entre checkpoints.
+
+import os
+import struct
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core  # noqa: E402
+from savefile import encode_save, decode_save, apply_journal, JOURNAL_HEADER, FRAME  # noqa: E402
+
+MOVES = ["right", "down", "left", "up"]
+
+
+@pytest.fixture
+def game(tmp_path, monkeypatch):
+    """Partida con nickname (se guarda en disco) dentro de un directorio temporal."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(core, "effects_enabled", False)
+    core.new_game("Tester", seed=21)
+    yield
+    core.delete_saves()
+
+
+def summary(saved):
+    """Lo que tiene que coincidir entre una foto del juego y un guardado leído."""
+    return {
+        "player": {k: saved["player"][k] for k in ("x", "y", "hp", "gold", "exp", "level")},
+        "enemies": sorted((e["uid"], e["x"], e["y"], e["hp"], e["type"]) for e in saved["enemies"]),
+        "tiles": bytes(saved["tiles"] if "tiles" in saved else saved["map_cells"]),
+        "explored": bytes(saved["explored"]),
+        "exit_pos": tuple(saved["exit_pos"]),
+        "shop_pos": tuple(saved["shop_pos"]) if saved["shop_pos"] else None,
+        "enemies_killed": saved["enemies_killed"],
+        "total_score": saved["total_score"],
+    }
+
+
+def play_and_save(turns):
+    """Juega unos turnos de exploración y guarda (esperando la escritura). Devuelve la foto guardada."""
+    for i in range(turns):
+        if core.game_state == "combate":
+            core.step("attack")
+        else:
+            core.step(MOVES[i % len(MOVES)] if i % 3 else "right")
+    assert core.game_state != "gameover"
+    core.save_game(wait=True)
+    return summary(core.snapshot_game())
+
+
+# ----------------------
+# GUARDADO BINARIO
+# ----------------------
+
+def test_encode_decode_round_trip(game):
+    snap = core.snapshot_game()
+    saved = decode_save(encode_save(snap, checkpoint_id=1234))
+    assert saved["checkpoint_id"] == 1234
+    assert saved["run_seed"] == 21
+    assert saved["player_nickname"] == "Tester"
+    assert summary(saved) == summary(snap)
+
+
+def test_decode_rejects_corrupted_data(game):
+    data = bytearray(encode_save(core.snapshot_game(), checkpoint_id=1))
+    for i in (len(data) // 2, len(data) - 1):   # En el cuerpo y en el CRC mismo
+        bad = bytearray(data)
+        bad[i] ^= 0x40
+        with pytest.raises(ValueError):
+            decode_save(bytes(bad))
+    with pytest.raises(ValueError):
+        decode_save(bytes(data[:10]))
+
+
+# ----------------------
+# DIARIO
+# ----------------------
+
+def test_checkpoint_plus_deltas_load_round_trip(game):
+    core.save_game(wait=True)
+    checkpoint_size = os.path.getsize(core.SAVE_FILE)
+    states = [play_and_save(3) for _ in range(4)]
+    assert os.path.getsize(core.SAVE_FILE) == checkpoint_size   # Solo creció el diario
+    assert os.path.getsize(core.JOURNAL_FILE) > JOURNAL_HEADER.size
+    assert summary(core.load_game()) == states[-1]
+
+
+def test_truncated_last_frame_is_ignored(game):
+    core.save_game(wait=True)
+    states = [play_and_save(3) for _ in range(3)]
+    with open(core.SAVE_FILE, "rb") as f:
+        checkpoint = f.read()
+    with open(core.JOURNAL_FILE, "rb") as f:
+        journal = f.read()
+
+    assert states[-1] != states[-2]
+    saved = decode_save(checkpoint)
+    assert apply_journal(saved, journal) == 3
+    assert summary(saved) == states[-1]
+
+    # Se corta la última tanda: queda el estado del guardado anterior
+    saved = decode_save(checkpoint)
+    assert apply_journal(saved, journal[:-2]) == 2
+    assert summary(saved) == states[-2]
+
+    # Solo queda el encabezado de la última tanda
+    last = JOURNAL_HEADER.size
+    while last + FRAME.size <= len(journal):
+        length = FRAME.unpack_from(journal, last)[0]
+        if last + FRAME.size + length == len(journal):
+            break
+        last += FRAME.size + length
+    saved = decode_save(checkpoint)
+    assert apply_journal(saved, journal[:last + FRAME.size]) == 2
+    assert summary(saved) == states[-2]
+
+
+def test_journal_of_another_checkpoint_is_discarded(game):
+    core.save_game(wait=True)
+    base = summary(core.snapshot_game())
+    play_and_save(3)
+    assert play_and_save(3) != base
+    with open(core.JOURNAL_FILE, "rb") as f:
+        journal = bytearray(f.read())
+    magic, version, checkpoint_id = JOURNAL_HEADER.unpack_from(journal, 0)
+    struct.pack_into(JOURNAL_HEADER.format, journal, 0, magic, version, (checkpoint_id + 1) & 0xFFFFFFFF)
+    with open(core.JOURNAL_FILE, "wb") as f:
+        f.write(journal)
+
+    saved = core.load_game()
+    assert summary(saved) == base
@@ -0,0 +1,66 @@
+# scheduler.py: orden de eventos con el mismo vencimiento, cancelación y clear_scheduler.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core  # noqa: E402
+from scheduler import make_scheduler, schedule, cancel, is_pending, advance, clear_scheduler  # noqa: E402
+
+
+def test_equal_times_run_in_scheduling_order():
+    sched = make_scheduler()
+    ran = []
+    for name in "abcde":
+        schedule(sched, 100, lambda name=name: ran.append(name))
+    schedule(sched, 50, lambda: ran.append("first"))
+    assert advance(sched, 99) == 1
+    assert ran == ["first"]
+    assert advance(sched, 1) == 5
+    assert ran == ["first", "a", "b", "c", "d", "e"]
+
+
+def test_cancel_and_replace_by_key():
+    sched = make_scheduler()
+    ran = []
+    schedule(sched, 10, lambda: ran.append("old"), key="enemy_turn")
+    schedule(sched, 20, lambda: ran.append("new"), key="enemy_turn")   # Reemplaza a "old"
+    schedule(sched, 10, lambda: ran.append("log"), key="combat_log")
+    assert is_pending(sched, "enemy_turn") and is_pending(sched, "combat_log")
+    assert cancel(sched, "combat_log")
+    assert not cancel(sched, "combat_log")
+    assert not is_pending(sched, "combat_log")
+    advance(sched, 30)
+    assert ran == ["new"]
+    assert not is_pending(sched, "enemy_turn")
+
+
+def test_clear_scheduler_drops_pending_events():
+    sched = make_scheduler()
+    ran = []
+    schedule(sched, 10, lambda: ran.append("stale"), key="enemy_turn")
+    schedule(sched, 10, lambda: ran.append("other"))
+    advance(sched, 5)
+    clear_scheduler(sched)
+    assert not is_pending(sched, "enemy_turn")
+    assert advance(sched, 100) == 0
+    assert ran == []
+    # El reloj sigue donde estaba: lo nuevo se planifica desde ahí
+    schedule(sched, 10, lambda: ran.append("fresh"), key="enemy_turn")
+    advance(sched, 9)
+    assert ran == []
+    advance(sched, 1)
+    assert ran == ["fresh"]
+
+
+def test_new_game_discards_stale_enemy_turn(monkeypatch):
+    monkeypatch.setattr(core, "effects_enabled", False)
+    core.new_game("", seed=1)
+    ran = []
+    schedule(core.timers, 100, lambda: ran.append("stale"), key="enemy_turn")
+    core.new_game("", seed=2)
+    assert not is_pending(core.timers, "enemy_turn")
+    advance(core.timers, 1000)
+    assert ran == []
@@ -0,0 +1,33 @@
+# text_cache.py
+# Caché LRU de textos ya renderizados (sin clases), compartida por main.py y menu.py.
+# Renderizar con una fuente es caro y el HUD, las etiquetas del mapa y los menús repiten
+# casi siempre los mismos textos: se guarda la Surface por (fuente, texto, color, antialias).
+# Las Surfaces devueltas son compartidas: solo se deben dibujar (blit), nunca modificar.
+
+from collections import OrderedDict
+
+TEXT_CACHE_MAX = 512   # Cantidad máxima de textos guardados
+
+text_cache = OrderedDict()          # (fuente, texto, color, antialias) -> Surface
+text_cache_stats = {"hits": 0, "misses": 0}
+
+
+def render_text(font, text, color, antialias=True):
+    """Igual que font.render(text, antialias, color), pero reutiliza el resultado si ya existe."""
+    key = (font, text, tuple(color), antialias)
+    surface = text_cache.get(key)
+    if surface is not None:
+        text_cache.move_to_end(key)
+        text_cache_stats["hits"] += 1
+        return surface
+    text_cache_stats["misses"] += 1
+    surface = font.render(text, antialias, color)
+    text_cache[key] = surface
+    if len(text_cache) > TEXT_CACHE_MAX:
+        text_cache.popitem(last=False)   # Descarta el menos usado recientemente
+    return surface
+
+def text_cache_hit_rate():
+    """Porcentaje de aciertos de la caché (0 si todavía no se usó)."""
+    total = text_cache_stats["hits"] + text_cache_stats["misses"]
+    return 100.0 * text_cache_stats["hits"] / total if total else 0.0